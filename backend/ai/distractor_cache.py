@@ -0,0 +1,101 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Context-independent distractor candidates (sense2vec neighbours and WordNet
+# co-hyponyms) keyed by (normalized answer, sense, subject). They are kept in
+# a SQLite file so that they survive restarts and are shared by every worker
+# process on the node; only the context-dependent filtering and MMR reranking
+# run per job. Beyond DISTRACTOR_CACHE_SIZE entries the least recently used
+# are evicted.
+DISTRACTOR_CACHE_PATH = os.getenv(
+    'DISTRACTOR_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'distractors.sqlite3')
+)
+DISTRACTOR_CACHE_SIZE = int(os.getenv('DISTRACTOR_CACHE_SIZE', 50000))
+# Bump whenever the candidate lookups change so that old entries are not served
+DISTRACTOR_CACHE_VERSION = 1
+
+def normalize_answer(answer):
+    return re.sub(r'\s+', ' ', str(answer)).strip().lower()
+
+class DistractorCache:
+    def __init__(self, path=DISTRACTOR_CACHE_PATH, max_size=DISTRACTOR_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.connection = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS distractors "
+                "(key TEXT PRIMARY KEY, candidates TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS distractors_last_used ON distractors (last_used)")
+            self.connection.commit()
+        return self.connection
+
+    def cache_key(self, answer, sense, subject):
+        return json.dumps([DISTRACTOR_CACHE_VERSION, normalize_answer(answer), sense or "", subject or ""])
+
+    def get(self, answer, sense, subject, stats=None):
+        return self.get_many([(answer, sense, subject)], stats)[0]
+
+    def get_many(self, lookups, stats=None):
+        # Candidates for each (answer, sense, subject) lookup, None for the
+        # misses. The last_used touches of the hits are written in one
+        # statement and commit. stats, when given, counts only these lookups;
+        # the counters in stats() are process-wide.
+        keys = [self.cache_key(answer, sense, subject) for answer, sense, subject in lookups]
+        with self.lock:
+            connection = self.connect()
+            rows = {}
+            for key in dict.fromkeys(keys):
+                row = connection.execute("SELECT candidates FROM distractors WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    rows[key] = row[0]
+            hits = sum(key in rows for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            if rows:
+                now = time.time()
+                connection.executemany("UPDATE distractors SET last_used = ? WHERE key = ?", [(now, key) for key in rows])
+                connection.commit()
+        if stats is not None:
+            stats["hits"] = stats.get("hits", 0) + hits
+            stats["misses"] = stats.get("misses", 0) + len(keys) - hits
+        return [json.loads(rows[key]) if key in rows else None for key in keys]
+
+    def put(self, answer, sense, subject, candidates):
+        key = self.cache_key(answer, sense, subject)
+        with self.lock:
+            connection = self.connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO distractors (key, candidates, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(candidates), time.time())
+            )
+            excess = connection.execute("SELECT COUNT(*) FROM distractors").fetchone()[0] - self.max_size
+            if excess > 0:
+                connection.execute(
+                    "DELETE FROM distractors WHERE key IN "
+                    "(SELECT key FROM distractors ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            connection.commit()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
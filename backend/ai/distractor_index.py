@@ -0,0 +1,139 @@
+import json
+import os
+import re
+import shutil
+import numpy as np
+from ai import model_store
+
+# sense2vec neighbours are looked up in a precomputed index instead of through
+# Sense2Vec.most_similar, which re-normalizes the whole vectors table on every
+# call. The vectors are L2-normalized once and stored as a float16 .npy file in
+# the model store, with the rows grouped by sense, and the file is opened with
+# mmap so every worker process on a node shares the same pages. The neighbours
+# of all the candidates of a job are found with one blocked matrix product
+# per sense.
+INDEX_NAME = "s2v_index"
+MATRIX_FILE = "vectors.npy"
+KEYS_FILE = "keys.json"
+BLOCK_ROWS = 65536
+
+def make_key(word, sense):
+    return re.sub(r"\s", "_", word) + "|" + sense
+
+def key_sense(key):
+    return key.rsplit("|", 1)[1]
+
+class DistractorIndex:
+    # Implements the part of the Sense2Vec API used by the question generator
+    # (get_best_sense, most_similar) plus most_similar_batch
+    def __init__(self, directory):
+        self.directory = directory
+        self.matrix = np.load(os.path.join(directory, MATRIX_FILE), mmap_mode='r')
+        with open(os.path.join(directory, KEYS_FILE), 'r') as f:
+            data = json.load(f)
+        self.keys = data["keys"]
+        self.freqs = data["freqs"]
+        self.sense_ranges = {sense: tuple(bounds) for sense, bounds in data["senses"].items()}
+        self.key2row = {key: row for row, key in enumerate(self.keys)}
+
+    def __contains__(self, key):
+        return key in self.key2row
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get_best_sense(self, word, senses=(), ignore_case=True):
+        # Same choice as Sense2Vec.get_best_sense: the most frequent matching key
+        senses = senses or list(self.sense_ranges)
+        versions = {word, word.lower(), word.upper(), word.title()} if ignore_case else [word]
+        freqs = []
+        for text in versions:
+            for sense in senses:
+                key = make_key(text, sense)
+                row = self.key2row.get(key)
+                if row is not None:
+                    freq = self.freqs[row]
+                    freqs.append((freq if freq is not None else -1, key))
+        return max(freqs)[1] if freqs else None
+
+    def most_similar(self, key, n=10):
+        return self.most_similar_batch([key], n)[key]
+
+    def most_similar_batch(self, keys, n=10):
+        # Neighbours are searched among the keys of the query's own sense, which
+        # is what filter_same_sense_words keeps of Sense2Vec.most_similar anyway
+        results = {}
+        by_sense = {}
+        for key in set(keys):
+            if key in self.key2row:
+                by_sense.setdefault(key_sense(key), []).append(key)
+            else:
+                results[key] = []
+        for sense, sense_keys in by_sense.items():
+            start, end = self.sense_ranges[sense]
+            query_rows = np.array([self.key2row[key] for key in sense_keys])
+            queries = np.asarray(self.matrix[query_rows], dtype=np.float32)
+            best_scores = np.full((len(sense_keys), 0), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(sense_keys), 0), dtype=np.int64)
+            for block_start in range(start, end, BLOCK_ROWS):
+                block_end = min(end, block_start + BLOCK_ROWS)
+                block = np.asarray(self.matrix[block_start:block_end], dtype=np.float32)
+                scores = queries @ block.T
+                own = (query_rows >= block_start) & (query_rows < block_end)
+                scores[np.nonzero(own)[0], query_rows[own] - block_start] = -np.inf
+                rows = np.broadcast_to(np.arange(block_start, block_end), scores.shape)
+                best_scores = np.concatenate([best_scores, scores], axis=1)
+                best_rows = np.concatenate([best_rows, rows], axis=1)
+                if best_scores.shape[1] > n:
+                    top = np.argpartition(-best_scores, n - 1, axis=1)[:, :n]
+                    best_scores = np.take_along_axis(best_scores, top, axis=1)
+                    best_rows = np.take_along_axis(best_rows, top, axis=1)
+            order = np.argsort(-best_scores, axis=1)
+            for i, key in enumerate(sense_keys):
+                results[key] = [(self.keys[best_rows[i, j]], float(best_scores[i, j]))
+                                for j in order[i] if np.isfinite(best_scores[i, j])]
+        return results
+
+    def neighbors_for(self, words, senses, n=10):
+        # {word: (best sense key or None, [(key, score), ...])} for a whole job
+        best = {word: self.get_best_sense(word, senses=senses) for word in set(words)}
+        similar = self.most_similar_batch([key for key in best.values() if key], n)
+        return {word: (key, similar[key] if key else []) for word, key in best.items()}
+
+def build_index(s2v, name=INDEX_NAME):
+    directory = model_store.model_path(name)
+    tmp_directory = f"{directory}.{os.getpid()}.tmp"
+    os.makedirs(tmp_directory, exist_ok=True)
+    entries = []
+    for key_id, row in s2v.vectors.key2row.items():
+        key = s2v.strings[key_id]
+        freq = s2v.get_freq(key_id)
+        entries.append((key_sense(key), -(freq or 0), key, row, freq))
+    entries.sort()
+    data = s2v.vectors.data
+    matrix = np.lib.format.open_memmap(os.path.join(tmp_directory, MATRIX_FILE), mode='w+',
+                                       dtype=np.float16, shape=(len(entries), data.shape[1]))
+    for start in range(0, len(entries), BLOCK_ROWS):
+        rows = [entry[3] for entry in entries[start:start + BLOCK_ROWS]]
+        block = np.asarray(data[rows], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[start:start + len(rows)] = block / np.where(norms == 0, 1, norms)
+    matrix.flush()
+    del matrix
+    senses = {}
+    for row, entry in enumerate(entries):
+        bounds = senses.setdefault(entry[0], [row, row + 1])
+        bounds[1] = row + 1
+    with open(os.path.join(tmp_directory, KEYS_FILE), 'w') as f:
+        json.dump({"keys": [entry[2] for entry in entries], "freqs": [entry[4] for entry in entries],
+                   "senses": senses}, f)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp_directory, directory)
+    model_store.record_entry(name, "s2v_old")
+    return DistractorIndex(directory)
+
+def load_index(name=INDEX_NAME):
+    if not model_store.verify_entry(name):
+        return None
+    return DistractorIndex(model_store.model_path(name))
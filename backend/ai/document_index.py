@@ -0,0 +1,83 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from nltk.tokenize import sent_tokenize
+
+DOCUMENT_INDEX_CACHE_SIZE = int(os.getenv('DOCUMENT_INDEX_CACHE_SIZE', 8))
+
+class DocumentIndex:
+    # Sentence-level retrieval index over one document: the sentence list, an
+    # L2-normalized embedding matrix and the embedding of the whole document.
+    # Built once and queried per question.
+    def __init__(self, text, encoder):
+        self.text = text
+        self.encoder = encoder
+        self.sentences = sent_tokenize(text)
+        self._embeddings = None
+        self._context_embedding = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sentences)
+
+    @property
+    def embeddings(self):
+        with self.lock:
+            if self._embeddings is None:
+                embeddings = np.asarray(self.encoder.encode(self.sentences), dtype=np.float32)
+                norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                norms[norms == 0] = 1
+                self._embeddings = embeddings / norms
+            return self._embeddings
+
+    @property
+    def context_embedding(self):
+        with self.lock:
+            if self._context_embedding is None:
+                self._context_embedding = self.encoder.encode([self.text])
+            return self._context_embedding
+
+    def neighbors(self, idx, window=1):
+        return range(max(0, idx - window), min(len(self.sentences), idx + window + 1))
+
+    def similarities(self, query):
+        query_embedding = np.asarray(self.encoder.encode([query])[0], dtype=np.float32)
+        norm = np.linalg.norm(query_embedding)
+        if norm > 0:
+            query_embedding = query_embedding / norm
+        return self.embeddings @ query_embedding
+
+    def select_relevant(self, query, num_sentences=8):
+        if len(self.sentences) <= num_sentences:
+            return self.text
+        similarities = self.similarities(query)
+        top_indices = sorted(similarities.argsort()[-num_sentences:][::-1])
+        extended_indices = set()
+        for idx in top_indices:
+            extended_indices.update(self.neighbors(idx))
+        extended_indices = sorted(extended_indices)
+        if len(extended_indices) > num_sentences + 4:
+            sorted_extended = sorted(extended_indices, key=lambda i: similarities[i], reverse=True)
+            extended_indices = sorted(sorted_extended[:num_sentences + 4])
+        return " ".join([self.sentences[i] for i in extended_indices])
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def get_document_index(text, encoder):
+    # Indexes are reused across questions of a job and across jobs that
+    # process the same content again.
+    key = hashlib.sha1(f"{getattr(encoder, 'model_name', '')}\0{text}".encode('utf-8')).hexdigest()
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = DocumentIndex(text, encoder)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > DOCUMENT_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,69 @@
+import re
+import numpy as np
+from strsimpy.normalized_levenshtein import NormalizedLevenshtein
+
+def char_shingles(text, size=3):
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def jaccard(a, b):
+    union = len(a | b)
+    return len(a & b) / union if union else 1.0
+
+class DuplicateIndex:
+    # Incremental near-duplicate detector for generated questions. Accepted
+    # questions are kept as L2-normalized embeddings in a growing array, so a
+    # new candidate costs one encode (usually a cache hit) and one dot product.
+    # Levenshtein is only computed for questions whose character-shingle
+    # Jaccard passes a cheap prefilter.
+    def __init__(self, encoder, threshold=0.85, shingle_threshold=0.3):
+        self.encoder = encoder
+        self.threshold = threshold
+        self.shingle_threshold = shingle_threshold
+        self.levenshtein = NormalizedLevenshtein()
+        self.texts = []
+        self.shingles = []
+        self.embeddings = None
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def embed(self, question):
+        embedding = np.asarray(self.encoder.encode([question])[0], dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def is_duplicate(self, question):
+        if self.count == 0:
+            return False
+        lowered = question.lower()
+        shingles = char_shingles(question)
+        for text, existing_shingles in zip(self.texts, self.shingles):
+            if jaccard(shingles, existing_shingles) < self.shingle_threshold:
+                continue
+            if self.levenshtein.similarity(lowered, text) > self.threshold:
+                return True
+        similarities = self.embeddings[:self.count] @ self.embed(question)
+        return float(np.max(similarities)) > self.threshold
+
+    def add(self, question):
+        embedding = self.embed(question)
+        if self.embeddings is None:
+            self.embeddings = np.zeros((16, embedding.shape[0]), dtype=np.float32)
+        elif self.count == len(self.embeddings):
+            grown = np.zeros((len(self.embeddings) * 2, embedding.shape[0]), dtype=np.float32)
+            grown[:self.count] = self.embeddings
+            self.embeddings = grown
+        self.embeddings[self.count] = embedding
+        self.texts.append(question.lower())
+        self.shingles.append(char_shingles(question))
+        self.count += 1
+
+    def add_if_new(self, question):
+        if self.is_duplicate(question):
+            return False
+        self.add(question)
+        return True
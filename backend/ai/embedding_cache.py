@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+# Sentence embeddings keyed by a hash of the normalized text. The in-memory
+# tier is a bounded LRU; EMBEDDING_CACHE_DIR enables an on-disk tier that
+# survives restarts and is shared by every process pointing at it.
+# The counters in stats() are process-wide; to count the lookups of one
+# generation stage, run it inside track(), which counts only the calling
+# thread's lookups (or pass a stats dict to encode).
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', 20000))
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR')
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', str(text)).strip()
+
+def new_stats():
+    return {"hits": 0, "disk_hits": 0, "misses": 0}
+
+class EmbeddingCache:
+    def __init__(self, model=None, model_name="", max_size=EMBEDDING_CACHE_SIZE, disk_dir=EMBEDDING_CACHE_DIR):
+        self.model = model
+        self.model_name = model_name
+        self.max_size = max_size
+        self.disk_dir = disk_dir
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.local = threading.local()
+
+    @contextmanager
+    def track(self, stats=None):
+        # Counts every lookup made by this thread while active into stats;
+        # nested trackers all count
+        stats = new_stats() if stats is None else stats
+        trackers = self.local.__dict__.setdefault("trackers", [])
+        trackers.append(stats)
+        try:
+            yield stats
+        finally:
+            trackers.pop()
+
+    def count(self, kind, n, stats=None):
+        for tracked in getattr(self.local, "trackers", []) + ([stats] if stats is not None else []):
+            tracked[kind] = tracked.get(kind, 0) + n
+
+    def text_key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+    def disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.npy")
+
+    def get(self, key, stats=None):
+        with self.lock:
+            embedding = self.entries.get(key)
+            if embedding is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        if embedding is not None:
+            self.count("hits", 1, stats)
+            return embedding
+        if self.disk_dir and os.path.exists(self.disk_path(key)):
+            try:
+                embedding = np.load(self.disk_path(key))
+            except Exception:
+                return None
+            self.put(key, embedding, persist=False)
+            with self.lock:
+                self.disk_hits += 1
+            self.count("disk_hits", 1, stats)
+            return embedding
+        return None
+
+    def put(self, key, embedding, persist=True):
+        with self.lock:
+            self.entries[key] = embedding
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        if persist and self.disk_dir:
+            path = self.disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+            np.save(tmp_path, embedding)
+            os.replace(tmp_path, path)
+
+    def encode(self, texts, model=None, stats=None):
+        model = model or self.model
+        if isinstance(texts, str):
+            texts = [texts]
+        keys = [self.text_key(t) for t in texts]
+        embeddings = {}
+        pending = OrderedDict()
+        for text, key in zip(texts, keys):
+            if key in embeddings or key in pending:
+                continue
+            embedding = self.get(key, stats)
+            if embedding is not None:
+                embeddings[key] = embedding
+            else:
+                pending[key] = normalize_text(text)
+        if pending:
+            with self.lock:
+                self.misses += len(pending)
+            self.count("misses", len(pending), stats)
+            computed = model.encode(list(pending.values()))
+            for key, embedding in zip(pending.keys(), computed):
+                embedding = np.asarray(embedding)
+                self.put(key, embedding)
+                embeddings[key] = embedding
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([embeddings[key] for key in keys])
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "size": len(self.entries),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = self.disk_hits = self.misses = 0
@@ -0,0 +1,74 @@
+import os
+import shutil
+import torch
+from ai import model_store
+
+# CPU inference backend for the T5 models:
+#   torch - fp32 PyTorch (default)
+#   int8  - dynamically quantized nn.Linear layers
+#   onnx  - ONNX Runtime encoder/decoder graphs with KV-cache (needs optimum[onnxruntime])
+# INFERENCE_BACKEND sets the default; INFERENCE_BACKEND_T5_SUMMARY,
+# INFERENCE_BACKEND_T5_QUESTION and INFERENCE_BACKEND_T5_ANSWER override it per model.
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')
+BACKENDS = ("torch", "int8", "onnx")
+T5_MODELS = ("t5_summary", "t5_question", "t5_answer")
+
+def backend_for(name):
+    backend = os.getenv(f'INFERENCE_BACKEND_{name.upper()}', INFERENCE_BACKEND).lower()
+    if backend not in BACKENDS:
+        print(f"Unknown inference backend '{backend}' for {name}, using torch")
+        return "torch"
+    return backend
+
+def quantize_int8(model):
+    # inplace avoids a temporary fp32 copy of the memory-mapped weights
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def onnx_entry(name):
+    # ONNX exports are model store entries of their own, verified like the weights
+    return f"onnx_{name}"
+
+def onnx_entries():
+    # Exports the configured backends need
+    return [onnx_entry(name) for name in T5_MODELS if backend_for(name) == "onnx"]
+
+def export_onnx(name):
+    # Used by prepare_resources.py only. The export is written next to the
+    # entry and moved into place once complete, and only recorded afterwards,
+    # so an interrupted export is never taken for a valid one.
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    entry = onnx_entry(name)
+    export_path = model_store.model_path(entry)
+    tmp_path = f"{export_path}.{os.getpid()}.tmp"
+    print(f"Exporting {name} to ONNX...")
+    ort_model = ORTModelForSeq2SeqLM.from_pretrained(model_store.model_path(name), export=True, use_cache=True)
+    ort_model.save_pretrained(tmp_path)
+    if os.path.exists(export_path):
+        shutil.rmtree(export_path)
+    os.replace(tmp_path, export_path)
+    model_store.record_entry(entry, name)
+
+def load_onnx(name):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    entry = onnx_entry(name)
+    model_store.require_entry(entry)
+    return ORTModelForSeq2SeqLM.from_pretrained(model_store.model_path(entry), use_cache=True, provider="CPUExecutionProvider")
+
+def prepare_model(name, model, backend=None):
+    backend = backend or backend_for(name)
+    if backend == "torch":
+        return model
+    if next(model.parameters()).device.type != "cpu":
+        print(f"Inference backend '{backend}' is CPU only, keeping torch for {name}")
+        return model
+    try:
+        if backend == "int8":
+            return quantize_int8(model)
+        return load_onnx(name)
+    except Exception as e:
+        print(f"Failed to prepare {backend} backend for {name}, falling back to torch: {e}")
+        if backend == "int8":
+            # Quantization works in place and may have replaced some layers
+            # before failing, so the fp32 model is reloaded from the store
+            model, _ = model_store.load_t5_from_store(name)
+        return model
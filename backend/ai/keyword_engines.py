@@ -0,0 +1,133 @@
+import math
+import os
+import string
+import time
+import traceback
+from collections import Counter, defaultdict
+import numpy as np
+from nltk.corpus import stopwords
+
+# Keyword extraction engines. An engine takes a DocumentAnalysis (anything
+# with .text, .doc and .index) and the number of keywords wanted, and returns
+# keyword strings, best first. "spacy" reuses the Doc that the analysis has
+# already parsed; "pke" runs MultipartiteRank, which parses the document again
+# with its own pipeline and clusters a candidate graph.
+KEYWORD_ENGINE = os.getenv('KEYWORD_ENGINE', 'spacy').lower()
+NUM_KEYWORDS = 30
+
+# Entity types that are never useful as answers
+SKIPPED_ENTITY_LABELS = {"CARDINAL", "ORDINAL", "PERCENT", "QUANTITY", "MONEY", "TIME"}
+
+def clean_phrase(span):
+    # Drops leading determiners, pronouns and other stop words ("the", "its")
+    tokens = list(span)
+    while tokens and (tokens[0].is_stop or tokens[0].is_punct or tokens[0].pos_ in ("DET", "PRON")):
+        tokens = tokens[1:]
+    while tokens and tokens[-1].is_punct:
+        tokens = tokens[:-1]
+    if not tokens or len(tokens) > 4 or all(t.is_stop for t in tokens):
+        return None
+    phrase = " ".join(t.text for t in tokens)
+    if len(phrase) < 3 or all(c in string.punctuation or c.isdigit() or c.isspace() for c in phrase):
+        return None
+    return phrase
+
+def spacy_keywords(analysis, n=NUM_KEYWORDS):
+    # Noun chunks and entities of the already-parsed Doc, scored by TF-IDF
+    # with sentences as documents and by embedding similarity to the document
+    doc = analysis.doc
+    sentences = list(doc.sents)
+    sentence_of = {}
+    for i, sentence in enumerate(sentences):
+        for token in sentence:
+            sentence_of[token.i] = i
+    spans = [(chunk, False) for chunk in doc.noun_chunks]
+    spans += [(ent, True) for ent in doc.ents if ent.label_ not in SKIPPED_ENTITY_LABELS]
+    counts = Counter()
+    sentence_sets = defaultdict(set)
+    surfaces = defaultdict(Counter)
+    entity_keys = set()
+    for span, is_entity in spans:
+        phrase = clean_phrase(span)
+        if not phrase:
+            continue
+        key = phrase.lower()
+        counts[key] += 1
+        sentence_sets[key].add(sentence_of.get(span.start, 0))
+        surfaces[key][phrase] += 1
+        if is_entity:
+            entity_keys.add(key)
+    if not counts:
+        return []
+    num_sentences = max(1, len(sentences))
+    keys = list(counts)
+    tfidf = np.array([
+        (1 + math.log(counts[key])) * math.log(1 + num_sentences / len(sentence_sets[key])) * (1.2 if key in entity_keys else 1.0)
+        for key in keys
+    ])
+    tfidf = tfidf / tfidf.max()
+    scores = tfidf
+    try:
+        # Embedding similarity of each candidate to the mean sentence embedding
+        index = analysis.index
+        document_embedding = index.embeddings.mean(axis=0)
+        document_embedding = document_embedding / (np.linalg.norm(document_embedding) or 1)
+        phrase_embeddings = np.asarray(index.encoder.encode([surfaces[key].most_common(1)[0][0] for key in keys]), dtype=np.float32)
+        norms = np.linalg.norm(phrase_embeddings, axis=1)
+        norms[norms == 0] = 1
+        similarity = (phrase_embeddings @ document_embedding) / norms
+        scores = 0.6 * tfidf + 0.4 * np.clip(similarity, 0, 1)
+    except Exception as e:
+        print(f"Keyword embedding scoring failed, using TF-IDF only: {e}")
+    order = np.argsort(-scores)
+    return [surfaces[keys[i]].most_common(1)[0][0] for i in order[:n]]
+
+def pke_keywords(analysis, n=NUM_KEYWORDS):
+    import pke
+    extractor = pke.unsupervised.MultipartiteRank()
+    extractor.load_document(input=analysis.text, language='en')
+    pos = {'PROPN', 'NOUN', 'ADJ', 'VERB', 'ADP', 'ADV', 'DET', 'CONJ', 'NUM', 'PRON', 'X'}
+    stoplist = list(string.punctuation)
+    stoplist += ['-lrb-', '-rrb-', '-lcb-', '-rcb-', '-lsb-', '-rsb-']
+    stoplist += stopwords.words('english')
+    extractor.candidate_selection(pos=pos)
+    extractor.candidate_weighting(alpha=1.1, threshold=0.75, method='average')
+    return [val[0] for val in extractor.get_n_best(n=n)]
+
+def frequency_keywords(analysis, n=15):
+    words = analysis.text.lower().split()
+    stoplist = set(stopwords.words('english'))
+    words = [w for w in words if w not in stoplist and len(w) > 3]
+    return [word for word, _ in Counter(words).most_common(n)]
+
+KEYWORD_ENGINES = {
+    "spacy": spacy_keywords,
+    "pke": pke_keywords,
+}
+
+def register_engine(name, engine):
+    KEYWORD_ENGINES[name] = engine
+
+def extract_keywords(analysis, engine=None, n=NUM_KEYWORDS):
+    # Returns (keywords, report); falls back to word frequencies if the engine
+    # fails or finds nothing, and says so in the report
+    engine = (engine or KEYWORD_ENGINE).lower()
+    if engine not in KEYWORD_ENGINES:
+        print(f"Unknown keyword engine '{engine}', using spacy")
+        engine = "spacy"
+    started = time.time()
+    report = {"engine": engine, "fallback": False}
+    try:
+        keywords = KEYWORD_ENGINES[engine](analysis, n)
+    except Exception as e:
+        print(f"Keyword engine '{engine}' failed: {e}")
+        traceback.print_exc()
+        keywords = []
+        report["error"] = str(e)
+    if not keywords:
+        keywords = frequency_keywords(analysis)
+        report["fallback"] = True
+    report["seconds"] = round(time.time() - started, 3)
+    report["count"] = len(keywords)
+    print(f"Keyword engine '{engine}': {len(keywords)} keywords in {report['seconds']}s")
+    return keywords, report
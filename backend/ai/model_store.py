@@ -0,0 +1,191 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import warnings
+import torch
+from transformers import AutoConfig, T5ForConditionalGeneration, T5Tokenizer
+from ai import resources
+
+# Weights are kept as safetensors files in a fixed directory instead of
+# per-CWD pickle caches. Tensors are created directly on top of a read-only
+# mmap of those files, so every worker process on a node shares the same
+# page-cache pages instead of holding a private copy of each model.
+MODEL_STORE_DIR = os.getenv(
+    'MODEL_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model_store')
+)
+MANIFEST_FILE = "manifest.json"
+
+MODEL_SOURCES = {
+    "t5_summary": "t5-base",
+    "t5_question": "ramsrigouthamg/t5_squad_v1",
+    "t5_answer": "google/flan-t5-large",
+    "sentence_transformer": "sentence-transformers/msmarco-distilbert-base-v2",
+}
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+# Keeps the mmaps alive for as long as the process uses the tensors built on them
+_open_maps = {}
+
+def model_path(name):
+    return os.path.join(MODEL_STORE_DIR, name)
+
+def load_manifest():
+    path = os.path.join(MODEL_STORE_DIR, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_manifest(manifest):
+    os.makedirs(MODEL_STORE_DIR, exist_ok=True)
+    path = os.path.join(MODEL_STORE_DIR, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def record_entry(name, source):
+    root = model_path(name)
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(full_path, root)
+            files[rel_path] = {"size": os.path.getsize(full_path), "sha256": file_sha256(full_path)}
+    manifest = load_manifest()
+    manifest[name] = {"source": source, "files": files}
+    save_manifest(manifest)
+
+def read_safetensors_header(path):
+    with open(path, 'rb') as f:
+        header_len = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_len))
+    return header, 8 + header_len
+
+def verify_entry(name, deep=False):
+    # The quick check compares file sizes and parses the safetensors headers;
+    # the deep check re-hashes every file against the manifest.
+    entry = load_manifest().get(name)
+    if not entry or not entry.get("files"):
+        return False
+    root = model_path(name)
+    for rel_path, info in entry["files"].items():
+        full_path = os.path.join(root, rel_path)
+        if not os.path.exists(full_path) or os.path.getsize(full_path) != info["size"]:
+            return False
+        if deep and file_sha256(full_path) != info["sha256"]:
+            return False
+        if rel_path.endswith(".safetensors"):
+            try:
+                header, data_start = read_safetensors_header(full_path)
+            except Exception:
+                return False
+            data_end = max([t["data_offsets"][1] for k, t in header.items() if k != "__metadata__"], default=0)
+            if data_start + data_end != info["size"]:
+                return False
+    return True
+
+def verify_store(deep=False):
+    return {name: verify_entry(name, deep=deep) for name in load_manifest()}
+
+def mmap_safetensors(path):
+    header, data_start = read_safetensors_header(path)
+    if path not in _open_maps:
+        with open(path, 'rb') as f:
+            _open_maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    mm = _open_maps[path]
+    state_dict = {}
+    with warnings.catch_warnings():
+        # frombuffer warns about the read-only buffer; the weights are never written
+        warnings.simplefilter("ignore")
+        for key, info in header.items():
+            if key == "__metadata__":
+                continue
+            dtype = SAFETENSORS_DTYPES[info["dtype"]]
+            start, end = info["data_offsets"]
+            if end == start:
+                state_dict[key] = torch.empty(info["shape"], dtype=dtype)
+                continue
+            itemsize = torch.tensor([], dtype=dtype).element_size()
+            tensor = torch.frombuffer(mm, dtype=dtype, count=(end - start) // itemsize, offset=data_start + start)
+            state_dict[key] = tensor.reshape(info["shape"])
+    return state_dict
+
+def safetensors_files(root):
+    index_path = os.path.join(root, "model.safetensors.index.json")
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            shards = sorted(set(json.load(f)["weight_map"].values()))
+        return [os.path.join(root, shard) for shard in shards]
+    return [os.path.join(root, "model.safetensors")]
+
+def load_t5_from_store(name):
+    root = model_path(name)
+    config = AutoConfig.from_pretrained(root)
+    with torch.device("meta"):
+        model = T5ForConditionalGeneration(config)
+    state_dict = {}
+    for path in safetensors_files(root):
+        state_dict.update(mmap_safetensors(path))
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+    missing = [n for n, p in model.named_parameters() if p.is_meta]
+    if missing:
+        raise RuntimeError(f"Model store entry '{name}' is missing weights: {missing[:5]}")
+    model.eval()
+    tokenizer = T5Tokenizer.from_pretrained(root)
+    return model, tokenizer
+
+def fetch_t5(name, source=None):
+    source = source or MODEL_SOURCES[name]
+    print(f"Fetching {source} into model store entry '{name}'...")
+    model = T5ForConditionalGeneration.from_pretrained(source)
+    tokenizer = T5Tokenizer.from_pretrained(source)
+    model.save_pretrained(model_path(name), safe_serialization=True)
+    tokenizer.save_pretrained(model_path(name))
+    record_entry(name, source)
+
+# The loaders below only read the store; fetching from the Hub is left to
+# prepare_resources.py (fetch_t5 / fetch_sentence_transformer)
+def require_entry(name):
+    if not verify_entry(name):
+        raise resources.MissingResources(resources.missing_message([f"model:{name}"]))
+
+def load_t5(name):
+    require_entry(name)
+    return load_t5_from_store(name)
+
+def fetch_sentence_transformer(name="sentence_transformer", source=None):
+    from sentence_transformers import SentenceTransformer
+    source = source or MODEL_SOURCES[name]
+    print(f"Fetching {source} into model store entry '{name}'...")
+    model = SentenceTransformer(source)
+    model.save(model_path(name), safe_serialization=True)
+    record_entry(name, source)
+
+def load_sentence_transformer(name="sentence_transformer"):
+    from sentence_transformers import SentenceTransformer
+    require_entry(name)
+    return SentenceTransformer(model_path(name))
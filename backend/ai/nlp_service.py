@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+
+from ai import resources
+
+# One spaCy pipeline per process, shared by the API (grading) and the question
+# generator. It is loaded on first use, so importing this module stays cheap.
+# Callers say what they need the Doc for and only the components that task
+# depends on run; the rest are skipped for that call only (spaCy's per-call
+# `disable`), so concurrent tasks never change the shared pipeline.
+NLP_BATCH_SIZE = int(os.getenv('NLP_BATCH_SIZE', 64))
+
+# Components kept per task; None runs the whole pipeline. In en_core_web_sm
+# the tagger and parser listen to the shared tok2vec, which also sets
+# doc.tensor (what Doc.vector and Doc.similarity use, as the model has no
+# static vectors), while ner embeds its own tok2vec.
+TASKS = {
+    "full": None,
+    "vectors": ("tok2vec",),
+    "sentences": ("tok2vec", "parser"),
+    "entities": ("ner",),
+}
+
+_nlp = None
+_nlp_lock = threading.Lock()
+_disabled = {}
+_stats = {}
+_stats_lock = threading.Lock()
+
+def get_nlp():
+    global _nlp
+    with _nlp_lock:
+        if _nlp is None:
+            nlp = resources.load_spacy()
+            for task, keep in TASKS.items():
+                _disabled[task] = [] if keep is None else [name for name in nlp.pipe_names if name not in keep]
+            _nlp = nlp
+    return _nlp
+
+def record(task, calls, docs, seconds):
+    with _stats_lock:
+        entry = _stats.setdefault(task, {"calls": 0, "docs": 0, "seconds": 0.0})
+        entry["calls"] += calls
+        entry["docs"] += docs
+        entry["seconds"] += seconds
+
+def stats():
+    # Per task: calls, documents processed, total and mean seconds per call
+    with _stats_lock:
+        return {task: dict(entry, msPerCall=round(entry["seconds"] * 1000 / max(1, entry["calls"]), 3))
+                for task, entry in _stats.items()}
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def pipe(texts, task="full", batch_size=None):
+    nlp = get_nlp()
+    texts = list(texts)
+    start = time.perf_counter()
+    docs = list(nlp.pipe(texts, batch_size=batch_size or NLP_BATCH_SIZE, disable=_disabled[task]))
+    record(task, 1, len(docs), time.perf_counter() - start)
+    return docs
+
+def parse(text, task="full"):
+    return pipe([text], task)[0]
+
+def similarities(pairs):
+    # Doc.similarity for each (text, other) pair, with both sides of every pair
+    # vectorized in one batch; an empty side scores 0
+    texts = [text for pair in pairs for text in pair]
+    docs = pipe(texts, "vectors")
+    results = []
+    for doc, other in zip(docs[::2], docs[1::2]):
+        results.append(doc.similarity(other) if doc and other else 0)
+    return results
+
+def count_sentences(text):
+    return len(list(parse(text, "sentences").sents))
+
+def entities(text):
+    return [(ent.text, ent.label_) for ent in parse(text, "entities").ents]
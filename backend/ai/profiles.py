@@ -0,0 +1,73 @@
+import os
+import threading
+
+# Generation profiles trade question quality for latency. A profile holds the
+# model.generate settings of every model call, the retry attempts of MCQ
+# question generation, how many MCQ candidates are over-generated and how the
+# summary is built. "balanced" is the behaviour of the generators before
+# profiles existed. The profile is chosen per upload and applies to the
+# thread that called set_profile, like set_thread_budget and set_seed.
+GENERATION_PROFILE = os.getenv('GENERATION_PROFILE', 'balanced').lower()
+# MCQ candidates sent to question generation per MCQ still needed (balanced profile)
+MCQ_OVERGENERATION = float(os.getenv('MCQ_OVERGENERATION', 1.5))
+# Summaries (balanced profile): "full" runs the map-reduce summarizer over the
+# whole document, "fast" uses the leading chunks without running the model
+SUMMARY_MODE = os.getenv('SUMMARY_MODE', 'full').lower()
+
+PROFILES = {
+    "fast": {
+        "question": {"num_beams": 2, "num_return_sequences": 2, "no_repeat_ngram_size": 3, "max_length": 64},
+        "question_attempts": 1,
+        "descriptive_question": {"num_beams": 2, "num_return_sequences": 2, "no_repeat_ngram_size": 2, "max_length": 64},
+        "answer": {"num_beams": 1, "no_repeat_ngram_size": 3, "min_length": 30, "max_length": 150},
+        "summary": {"num_beams": 1, "no_repeat_ngram_size": 2, "min_length": 40, "max_length": 150},
+        "summary_chunk": {"num_beams": 1, "no_repeat_ngram_size": 2, "min_length": 15, "max_length": 80},
+        "mcq_overgeneration": 1.2,
+        "summary_mode": "fast",
+    },
+    "balanced": {
+        "question": {"num_beams": 8, "num_return_sequences": 5, "no_repeat_ngram_size": 3, "max_length": 100},
+        "question_attempts": 3,
+        "descriptive_question": {"num_beams": 5, "num_return_sequences": 5, "no_repeat_ngram_size": 2, "max_length": 100},
+        "answer": {"num_beams": 5, "length_penalty": 1.5, "no_repeat_ngram_size": 3, "min_length": 50, "max_length": 250},
+        "summary": {"num_beams": 3, "no_repeat_ngram_size": 2, "min_length": 75, "max_length": 300},
+        "summary_chunk": {"num_beams": 3, "no_repeat_ngram_size": 2, "min_length": 20, "max_length": 120},
+        "mcq_overgeneration": MCQ_OVERGENERATION,
+        "summary_mode": SUMMARY_MODE,
+    },
+    "thorough": {
+        "question": {"num_beams": 10, "num_return_sequences": 8, "no_repeat_ngram_size": 3, "max_length": 100},
+        "question_attempts": 4,
+        "descriptive_question": {"num_beams": 8, "num_return_sequences": 8, "no_repeat_ngram_size": 2, "max_length": 100},
+        "answer": {"num_beams": 6, "length_penalty": 1.5, "no_repeat_ngram_size": 3, "min_length": 60, "max_length": 300},
+        "summary": {"num_beams": 4, "no_repeat_ngram_size": 2, "min_length": 75, "max_length": 300},
+        "summary_chunk": {"num_beams": 4, "no_repeat_ngram_size": 2, "min_length": 20, "max_length": 120},
+        "mcq_overgeneration": 2.5,
+        "summary_mode": "full",
+    },
+}
+
+_active = threading.local()
+
+def resolve_profile(name):
+    name = (name or GENERATION_PROFILE).lower()
+    if name not in PROFILES:
+        print(f"Unknown generation profile '{name}', using balanced")
+        return "balanced"
+    return name
+
+def set_profile(name):
+    _active.name = resolve_profile(name)
+
+def active_profile_name():
+    return getattr(_active, "name", None) or resolve_profile(GENERATION_PROFILE)
+
+def active_profile():
+    return PROFILES[active_profile_name()]
+
+def generate_kwargs(call):
+    # model.generate settings of one model call of the active profile
+    settings = dict(active_profile()[call])
+    settings.setdefault("num_return_sequences", 1)
+    settings["early_stopping"] = settings["num_beams"] > 1
+    return settings
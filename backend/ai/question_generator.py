@@ -1,30 +1,29 @@
 import warnings
 warnings.filterwarnings("ignore")
 import torch
-from transformers import T5ForConditionalGeneration, T5Tokenizer
-from sense2vec import Sense2Vec
-from sentence_transformers import SentenceTransformer
 import random
 import numpy as np
-import nltk
 from nltk.corpus import wordnet as wn
 from nltk.tokenize import sent_tokenize
 from nltk.corpus import stopwords
 import string
-import pke
-import traceback
-from flashtext import KeywordProcessor
 from collections import OrderedDict, Counter
 from sklearn.metrics.pairwise import cosine_similarity
-import pickle
 import os
-import sys
-import subprocess
 from strsimpy.normalized_levenshtein import NormalizedLevenshtein
-import spacy
-import pdfplumber
 import re
-from typing import List, Dict, Optional
+import math
+import hashlib
+import threading
+from itertools import islice
+from bisect import bisect_right
+from typing import List, Dict, Optional, Callable
+from ai import model_store, inference_backends, distractor_index, keyword_engines, resources, nlp_service
+from ai.profiles import active_profile, active_profile_name, generate_kwargs
+from ai.embedding_cache import EmbeddingCache
+from ai.distractor_cache import DistractorCache
+from ai.duplicate_index import DuplicateIndex
+from ai.document_index import get_document_index
 
 # Global variables for models
 s2v = None
@@ -35,27 +34,43 @@ question_tokenizer = None
 answer_model = None
 answer_tokenizer = None
 sentence_transformer_model = None
+embedding_cache = EmbeddingCache(model_name=model_store.MODEL_SOURCES["sentence_transformer"])
+distractor_cache = DistractorCache()
 
 # Check for GPU availability
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# Initialize spaCy
-try:
-    nlp = spacy.load("en_core_web_sm")
-except:
-    if not os.path.exists("en_core_web_sm"):
-        subprocess.check_call([sys.executable, "-m", "spacy", "download", "en_core_web_sm"])
-    nlp = spacy.load("en_core_web_sm")
+# Number of (context, answer) prompts encoded into one question beam search
+QUESTION_BATCH_SIZE = int(os.getenv('QUESTION_BATCH_SIZE', 8))
+# Number of descriptive answers generated together by the flan-t5-large model
+ANSWER_BATCH_SIZE = int(os.getenv('ANSWER_BATCH_SIZE', 4))
+# Number of chunks (or partial summaries) summarized together by t5-base
+SUMMARY_BATCH_SIZE = int(os.getenv('SUMMARY_BATCH_SIZE', 4))
+# Words of partial summaries condensed together in one reduce step
+SUMMARY_REDUCE_WORDS = 300
+# Number of DocumentAnalysis results kept so re-uploads skip preprocessing
+ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', 4))
 
-# Download NLTK resources
-nltk.download('punkt', quiet=True)
-nltk.download('wordnet', quiet=True)
-nltk.download('stopwords', quiet=True)
-nltk.download('omw-1.4', quiet=True)
+# NLTK data comes from the resource directory installed by
+# prepare_resources.py; nothing is downloaded here. spaCy is the pipeline
+# shared through ai.nlp_service.
+resources.configure_nltk()
+
+# Each thread draws from its own RNG, so a seeded run is reproducible even
+# while the MCQ and descriptive generators run concurrently
+class ThreadLocalRandom(threading.local):
+    def __init__(self):
+        self.rng = random.Random()
+
+    def __getattr__(self, name):
+        return getattr(self.rng, name)
+
+rng = ThreadLocalRandom()
 
 # Helper functions
 def set_seed(seed):
     random.seed(seed)
+    rng.seed(seed)
     np.random.seed(seed)
     torch.manual_seed(seed)
     if torch.cuda.is_available():
@@ -68,101 +83,149 @@ def postprocesstext(content):
         final = final + " " + sent
     return final
 
+def summarize_batch(texts, model, tokenizer, call="summary", batch_size=None):
+    batch_size = batch_size or SUMMARY_BATCH_SIZE
+    prompts = ["summarize: " + text.strip().replace("\n", " ") for text in texts]
+    # Sorting by prompt length keeps padding inside each batch to a minimum
+    lengths = [len(tokenizer.encode(p, max_length=512, truncation=True)) for p in prompts]
+    order = sorted(range(len(prompts)), key=lambda i: lengths[i])
+    summaries = [None] * len(prompts)
+    for start in range(0, len(order), batch_size):
+        batch_indices = order[start:start + batch_size]
+        encoding = tokenizer([prompts[i] for i in batch_indices], max_length=512, padding=True,
+                             truncation=True, return_tensors="pt").to(device)
+        with torch.no_grad():
+            outs = model.generate(input_ids=encoding["input_ids"],
+                                  attention_mask=encoding["attention_mask"],
+                                  **generate_kwargs(call))
+        decoded = tokenizer.batch_decode(outs, skip_special_tokens=True)
+        for i, summary in zip(batch_indices, decoded):
+            summaries[i] = postprocesstext(summary).strip()
+    return summaries
+
 def summarizer(text, model, tokenizer):
-    text = text.strip().replace("\n", " ")
-    text = "summarize: " + text
-    max_len = 512
-    encoding = tokenizer.encode_plus(text, max_length=max_len, pad_to_max_length=False, 
-                                    truncation=True, return_tensors="pt").to(device)
-    input_ids, attention_mask = encoding["input_ids"], encoding["attention_mask"]
-    outs = model.generate(input_ids=input_ids,
-                         attention_mask=attention_mask,
-                         early_stopping=True,
-                         num_beams=3,
-                         num_return_sequences=1,
-                         no_repeat_ngram_size=2,
-                         min_length=75,
-                         max_length=300)
-    dec = [tokenizer.decode(ids, skip_special_tokens=True) for ids in outs]
-    summary = dec[0]
-    summary = postprocesstext(summary)
-    summary = summary.strip()
-    return summary
-
-def get_nouns_multipartite(content):
-    out = []
-    try:
-        extractor = pke.unsupervised.MultipartiteRank()
-        extractor.load_document(input=content, language='en')
-        pos = {'PROPN', 'NOUN', 'ADJ', 'VERB', 'ADP', 'ADV', 'DET', 'CONJ', 'NUM', 'PRON', 'X'}
-        stoplist = list(string.punctuation)
-        stoplist += ['-lrb-', '-rrb-', '-lcb-', '-rcb-', '-lsb-', '-rsb-']
-        stoplist += stopwords.words('english')
-        extractor.candidate_selection(pos=pos)
-        extractor.candidate_weighting(alpha=1.1, threshold=0.75, method='average')
-        keyphrases = extractor.get_n_best(n=30)
-        for val in keyphrases:
-            out.append(val[0])
-    except:
-        out = []
-    return out
-
-def get_keywords(originaltext):
-    keywords = get_nouns_multipartite(originaltext)
-    return keywords
-
-def get_improved_question(context, answer, model, tokenizer, max_attempts=3):
-    problem_patterns = [
-        r"generate a specific question for",
-        r"specific question for",
-        r"question for this answer",
-        r"what question",
-        r"which question"
-    ]
-    prompt_templates = [
+    return summarize_batch([text], model, tokenizer)[0]
+
+def group_partial_summaries(partials, max_words=SUMMARY_REDUCE_WORDS):
+    # Every group holds at least two partial summaries, so each reduce round
+    # at least halves their number
+    groups = []
+    current = []
+    for partial in partials:
+        words = sum(len(p.split()) for p in current) + len(partial.split())
+        if len(current) >= 2 and words > max_words:
+            groups.append(current)
+            current = []
+        current.append(partial)
+    if len(current) == 1 and groups:
+        groups[-1].append(current[0])
+    elif current:
+        groups.append(current)
+    return groups
+
+def summarize_document(text, model, tokenizer, chunks=None, batch_size=None):
+    # Map-reduce: every ~200 word chunk from preprocess_context is summarized
+    # (map), then the partial summaries are condensed in groups until one
+    # summary is left (reduce). The map pass costs one bounded summary per
+    # chunk and every reduce round at least halves the partials, so the cost
+    # grows linearly with the document length.
+    chunks = preprocess_context(text) if chunks is None else chunks
+    if len(chunks) <= 1:
+        return summarizer(text, model, tokenizer)
+    partials = summarize_batch(chunks, model, tokenizer, call="summary_chunk", batch_size=batch_size)
+    rounds = 0
+    while sum(len(p.split()) for p in partials) > SUMMARY_REDUCE_WORDS and len(partials) > 1:
+        groups = group_partial_summaries(partials)
+        partials = summarize_batch([" ".join(group) for group in groups], model, tokenizer,
+                                   call="summary_chunk", batch_size=batch_size)
+        rounds += 1
+    print(f"Summarized {len(chunks)} chunks with {rounds} reduce rounds")
+    return summarizer(" ".join(partials), model, tokenizer)
+
+QUESTION_PROBLEM_PATTERNS = [
+    r"generate a specific question for",
+    r"specific question for",
+    r"question for this answer",
+    r"what question",
+    r"which question"
+]
+
+def question_prompt_templates(context, answer):
+    return [
         f"context: {context} answer: {answer} Generate a question for this answer.",
         f"Based on this context: {context} Create a question whose answer is: {answer}",
         f"From the text: {context} Generate a question that has the answer: {answer}",
     ]
-    for attempt in range(max_attempts):
-        text = prompt_templates[attempt % len(prompt_templates)]
-        encoding = tokenizer.encode_plus(text, max_length=512, pad_to_max_length=False, 
-                                        truncation=True, return_tensors="pt").to(device)
-        input_ids, attention_mask = encoding["input_ids"], encoding["attention_mask"]
-        outs = model.generate(input_ids=input_ids,
-                             attention_mask=attention_mask,
-                             early_stopping=True,
-                             num_beams=8,
-                             num_return_sequences=5,
-                             no_repeat_ngram_size=3,
-                             max_length=100)
-        questions = [tokenizer.decode(ids, skip_special_tokens=True) for ids in outs]
-        filtered_questions = []
-        for q in questions:
-            q = q.replace("question:", "").strip()
-            q = q.replace("Question:", "").strip()
-            has_problem = False
-            for pattern in problem_patterns:
-                if re.search(pattern, q, re.IGNORECASE):
-                    has_problem = True
-                    break
-            if not has_problem and len(q) > 10:
-                filtered_questions.append(q)
-        if filtered_questions:
-            best_question = max(filtered_questions, key=lambda q: len(q.split()))
-            if not best_question.endswith("?"):
-                best_question += "?"
-            best_question = best_question[0].upper() + best_question[1:]
-            if "?" in best_question and len(best_question.split()) > 3:
-                return best_question
-    answer_doc = nlp(answer)
-    if any(ent.label_ == "PERSON" for ent in answer_doc.ents):
-        fallback = f"Who is {answer}?"
+
+def select_best_question(questions):
+    filtered_questions = []
+    for q in questions:
+        q = q.replace("question:", "").strip()
+        q = q.replace("Question:", "").strip()
+        has_problem = False
+        for pattern in QUESTION_PROBLEM_PATTERNS:
+            if re.search(pattern, q, re.IGNORECASE):
+                has_problem = True
+                break
+        if not has_problem and len(q) > 10:
+            filtered_questions.append(q)
+    if filtered_questions:
+        best_question = max(filtered_questions, key=lambda q: len(q.split()))
+        if not best_question.endswith("?"):
+            best_question += "?"
+        best_question = best_question[0].upper() + best_question[1:]
+        if "?" in best_question and len(best_question.split()) > 3:
+            return best_question
+    return None
+
+def fallback_question(answer):
+    if any(label == "PERSON" for _, label in nlp_service.entities(answer)):
+        return f"Who is {answer}?"
     elif answer.endswith('s') and not answer.endswith('ss'):
-        fallback = f"What are {answer}?"
-    else:
-        fallback = f"What is {answer}?"
-    return fallback
+        return f"What are {answer}?"
+    return f"What is {answer}?"
+
+def get_improved_question(context, answer, model, tokenizer, max_attempts=None):
+    return get_improved_questions_batch([(context, answer)], model, tokenizer, max_attempts=max_attempts, batch_size=1)[0]
+
+def get_improved_questions_batch(items, model, tokenizer, max_attempts=None, batch_size=None):
+    # One padded beam search per batch; only candidates whose outputs were all
+    # rejected by the problem-pattern filter are retried with the next template.
+    batch_size = batch_size or QUESTION_BATCH_SIZE
+    max_attempts = max_attempts or active_profile()["question_attempts"]
+    settings = generate_kwargs("question")
+    num_return_sequences = settings["num_return_sequences"]
+    results = [None] * len(items)
+    remaining = list(range(len(items)))
+    for attempt in range(max_attempts):
+        if not remaining:
+            break
+        failed = []
+        for start in range(0, len(remaining), batch_size):
+            batch_indices = remaining[start:start + batch_size]
+            texts = []
+            for i in batch_indices:
+                context, answer = items[i]
+                templates = question_prompt_templates(context, answer)
+                texts.append(templates[attempt % len(templates)])
+            encoding = tokenizer(texts, max_length=512, padding=True,
+                                 truncation=True, return_tensors="pt").to(device)
+            with torch.no_grad():
+                outs = model.generate(input_ids=encoding["input_ids"],
+                                      attention_mask=encoding["attention_mask"],
+                                      **settings)
+            decoded = tokenizer.batch_decode(outs, skip_special_tokens=True)
+            for pos, i in enumerate(batch_indices):
+                questions = decoded[pos * num_return_sequences:(pos + 1) * num_return_sequences]
+                best_question = select_best_question(questions)
+                if best_question:
+                    results[i] = best_question
+                else:
+                    failed.append(i)
+        remaining = failed
+    for i in remaining:
+        results[i] = fallback_question(items[i][1])
+    return results
 
 def filter_same_sense_words(original, wordlist):
     filtered_words = []
@@ -190,13 +253,17 @@ def get_highest_similarity_score(wordlist, wrd):
             score.append(0)
     return max(score) if score else 0
 
-def sense2vec_get_words(word, s2v, topn, question):
+S2V_SENSES = ["NOUN", "PERSON", "PRODUCT", "LOC", "ORG", "EVENT", "NORP", "WORK OF ART", "FAC", "GPE", "NUM", "FACILITY"]
+
+def sense2vec_get_words(word, s2v, topn, question, neighbors=None):
     output = []
     try:
-        sense = s2v.get_best_sense(word, senses=["NOUN", "PERSON", "PRODUCT", "LOC", "ORG", 
-                                                "EVENT", "NORP", "WORK OF ART", "FAC", "GPE", "NUM", "FACILITY"])
-        most_similar = s2v.most_similar(sense, n=topn)
-        output = filter_same_sense_words(sense, most_similar)
+        if neighbors is not None and word in neighbors:
+            sense, most_similar = neighbors[word]
+        else:
+            sense = s2v.get_best_sense(word, senses=S2V_SENSES)
+            most_similar = s2v.most_similar(sense, n=topn)
+        output = filter_same_sense_words(sense, most_similar) if sense else []
     except:
         output = []
     threshold = 0.6
@@ -244,14 +311,50 @@ def get_distractors_wordnet(word):
         pass
     return distractors
 
-def get_improved_distractors(word, origsentence, sense2vecmodel, sentencemodel, top_n=40, lambdaval=0.2):
-    distractors_s2v = sense2vec_get_words(word, sense2vecmodel, top_n, origsentence)
-    distractors_wordnet = get_distractors_wordnet(word)
-    all_distractors = list(set(distractors_s2v + distractors_wordnet))
+def get_distractor_pools(words, sense2vecmodel, subject=None, top_n=40, stats=None):
+    # Context-independent distractor candidates per word, from the persistent
+    # distractor cache (looked up in one round, counted into stats) or, for
+    # the misses, from sense2vec and WordNet
+    senses = {}
+    for word in set(words):
+        try:
+            sense = sense2vecmodel.get_best_sense(word, senses=S2V_SENSES)
+        except:
+            sense = None
+        senses[word] = sense.rsplit("|", 1)[1] if sense else None
+    pools = {}
+    misses = []
+    cached = distractor_cache.get_many([(word, sense, subject) for word, sense in senses.items()], stats)
+    for word, pool in zip(senses, cached):
+        if pool is None:
+            misses.append(word)
+        else:
+            pools[word] = pool
+    neighbors = None
+    if misses and isinstance(sense2vecmodel, distractor_index.DistractorIndex):
+        neighbors = sense2vecmodel.neighbors_for(misses, S2V_SENSES, n=top_n)
+    for word in misses:
+        pool = {
+            "sense2vec": sense2vec_get_words(word, sense2vecmodel, top_n, "", neighbors=neighbors),
+            "wordnet": get_distractors_wordnet(word)
+        }
+        distractor_cache.put(word, senses[word], subject, pool)
+        pools[word] = pool
+    return pools
+
+def get_improved_distractors(word, origsentence, sense2vecmodel, sentencemodel, top_n=40, lambdaval=0.2, neighbors=None, pool=None):
+    if pool is None:
+        distractors_s2v = sense2vec_get_words(word, sense2vecmodel, top_n, origsentence, neighbors=neighbors)
+        distractors_wordnet = get_distractors_wordnet(word)
+    else:
+        checklist = origsentence.split()
+        distractors_s2v = [x for x in pool["sense2vec"] if x not in checklist]
+        distractors_wordnet = pool["wordnet"]
+    # De-duplicated in order: set order would vary with PYTHONHASHSEED across processes
+    all_distractors = list(dict.fromkeys(distractors_s2v + distractors_wordnet))
     if len(all_distractors) < 3:
         try:
-            doc = nlp(origsentence)
-            word_doc = nlp(word)
+            doc, word_doc = nlp_service.pipe([origsentence, word])
             word_ents = [e.label_ for e in word_doc.ents]
             context_entities = []
             for ent in doc.ents:
@@ -263,14 +366,14 @@ def get_improved_distractors(word, origsentence, sense2vecmodel, sentencemodel,
                 all_distractors.extend(nouns)
         except:
             pass
-    all_distractors = list(set([d for d in all_distractors if d.lower() != word.lower()]))
+    all_distractors = list(dict.fromkeys(d for d in all_distractors if d.lower() != word.lower()))
     if len(all_distractors) == 0:
         return []
     try:
         embedding_sentence = origsentence + " " + word.capitalize()
-        keyword_embedding = sentencemodel.encode([embedding_sentence])
+        keyword_embedding = embedding_cache.encode([embedding_sentence], model=sentencemodel)
         if all_distractors:
-            distractor_embeddings = sentencemodel.encode(all_distractors)
+            distractor_embeddings = embedding_cache.encode(all_distractors, model=sentencemodel)
             max_distractors = min(len(all_distractors), 5)
             filtered_distractors = mmr(keyword_embedding, distractor_embeddings, all_distractors, max_distractors, lambdaval)
             final_distractors = []
@@ -284,8 +387,8 @@ def get_improved_distractors(word, origsentence, sense2vecmodel, sentencemodel,
 
 def assess_question_difficulty(answer, distractors, sentencemodel):
     try:
-        answer_embedding = sentencemodel.encode([answer])[0].reshape(1, -1)
-        distractor_embeddings = sentencemodel.encode(distractors)
+        answer_embedding = embedding_cache.encode([answer], model=sentencemodel)[0].reshape(1, -1)
+        distractor_embeddings = embedding_cache.encode(distractors, model=sentencemodel)
         similarities = cosine_similarity(answer_embedding, distractor_embeddings)[0]
         max_similarity = max(similarities) if len(similarities) > 0 else 0
         if max_similarity > 0.9:
@@ -313,19 +416,42 @@ def preprocess_context(text):
         chunks.append(current_chunk.strip())
     return chunks
 
-def extract_key_segments(text, keywords, num_segments=100, min_length=40, max_length=250):
-    sentences = sent_tokenize(text)
-    sentence_embeddings = sentence_transformer_model.encode(sentences)
-    sentence_scores = []
-    for i, sentence in enumerate(sentences):
-        score = 0
-        for keyword in keywords:
-            if keyword.lower() in sentence.lower():
-                score += 1
-        keyword_embeddings = sentence_transformer_model.encode([" ".join(keywords)])
-        semantic_score = cosine_similarity([sentence_embeddings[i]], keyword_embeddings)[0][0]
-        combined_score = score + (semantic_score * 3)
-        sentence_scores.append((sentence, combined_score, i))
+def count_keyword_hits(sentences, keywords):
+    # Scans the lowercased document once per keyword and maps each match back
+    # to its sentence, instead of testing every (sentence, keyword) pair.
+    lowered = [sentence.lower() for sentence in sentences]
+    starts = []
+    position = 0
+    for sentence in lowered:
+        starts.append(position)
+        position += len(sentence) + 1
+    text = "\x00".join(lowered)
+    hits = np.zeros(len(sentences))
+    for keyword in keywords:
+        keyword = keyword.lower()
+        if not keyword:
+            hits += 1
+            continue
+        matched = []
+        start = text.find(keyword)
+        while start != -1:
+            idx = bisect_right(starts, start) - 1
+            matched.append(idx)
+            if idx + 1 >= len(starts):
+                break
+            start = text.find(keyword, starts[idx + 1])
+        hits[matched] += 1
+    return hits
+
+def extract_key_segments(text, keywords, num_segments=100, min_length=40, max_length=250, sentences=None):
+    sentences = sentences if sentences is not None else sent_tokenize(text)
+    if not sentences:
+        return []
+    sentence_embeddings = embedding_cache.encode(sentences)
+    keyword_embedding = embedding_cache.encode([" ".join(keywords)])
+    semantic_scores = cosine_similarity(sentence_embeddings, keyword_embedding)[:, 0]
+    combined_scores = count_keyword_hits(sentences, keywords) + (semantic_scores * 3)
+    sentence_scores = [(sentence, combined_scores[i], i) for i, sentence in enumerate(sentences)]
     sentence_scores.sort(key=lambda x: (x[1], -x[2]), reverse=True)
     segments = []
     used_indices = set()
@@ -334,7 +460,7 @@ def extract_key_segments(text, keywords, num_segments=100, min_length=40, max_le
             break
         if idx in used_indices:
             continue
-        context_size = random.randint(1, 3)
+        context_size = rng.randint(1, 3)
         start_idx = max(0, idx - context_size)
         end_idx = min(len(sentences), idx + context_size + 1)
         overlap_count = sum(1 for i in range(start_idx, end_idx) if i in used_indices)
@@ -363,17 +489,13 @@ def generate_descriptive_question(context, model, tokenizer):
         f"ask a question that would help someone understand this material: {context}",
         f"generate a question that assesses understanding of this content: {context}"
     ]
-    prompt = random.choice(prompt_templates)
+    prompt = rng.choice(prompt_templates)
     encoding = tokenizer.encode_plus(prompt, max_length=512, pad_to_max_length=False, 
                                     truncation=True, return_tensors="pt").to(device)
     input_ids, attention_mask = encoding["input_ids"], encoding["attention_mask"]
     outs = model.generate(input_ids=input_ids,
                          attention_mask=attention_mask,
-                         early_stopping=True,
-                         num_beams=5,
-                         num_return_sequences=5,
-                         no_repeat_ngram_size=2,
-                         max_length=100)
+                         **generate_kwargs("descriptive_question"))
     questions = [tokenizer.decode(ids, skip_special_tokens=True) for ids in outs]
     filtered_questions = []
     for q in questions:
@@ -385,7 +507,7 @@ def generate_descriptive_question(context, model, tokenizer):
             q = re.sub(r"^(generate|create|form|ask|write|make).*?:", "", q, flags=re.IGNORECASE).strip()
             filtered_questions.append(q)
     if not filtered_questions:
-        doc = nlp(context)
+        doc = nlp_service.parse(context)
         subjects = [token.text for token in doc if token.dep_ == "nsubj"]
         if subjects:
             subject = subjects[0]
@@ -400,79 +522,71 @@ def generate_descriptive_question(context, model, tokenizer):
         return fallback
     return max(filtered_questions, key=lambda q: len(q.split()))
 
+def new_duplicate_index(questions=(), threshold=0.85):
+    index = DuplicateIndex(embedding_cache, threshold=threshold)
+    for q in questions:
+        index.add(q["question"] if isinstance(q, dict) else q)
+    return index
+
 def is_duplicate(new_question, existing_questions, threshold=0.85):
     if not existing_questions:
         return False
-    normalized_levenshtein = NormalizedLevenshtein()
-    existing_texts = [q["question"] for q in existing_questions]
-    for existing in existing_texts:
-        similarity = normalized_levenshtein.similarity(new_question.lower(), existing.lower())
-        if similarity > threshold:
-            return True
-    new_embedding = sentence_transformer_model.encode([new_question])
-    existing_embeddings = sentence_transformer_model.encode(existing_texts)
-    similarities = cosine_similarity(new_embedding, existing_embeddings)[0]
-    if max(similarities) > threshold:
-        return True
-    return False
-
-def select_relevant_sentences(question, context, num_sentences=8):
-    sentences = sent_tokenize(context)
-    if len(sentences) <= num_sentences:
-        return context
-    question_embedding = sentence_transformer_model.encode([question])
-    sentence_embeddings = sentence_transformer_model.encode(sentences)
-    similarities = cosine_similarity(question_embedding, sentence_embeddings)[0]
-    top_indices = similarities.argsort()[-num_sentences:][::-1]
-    top_indices = sorted(top_indices)
-    extended_indices = set()
-    for idx in top_indices:
-        extended_indices.add(idx)
-        if idx > 0:
-            extended_indices.add(idx - 1)
-        if idx < len(sentences) - 1:
-            extended_indices.add(idx + 1)
-    extended_indices = sorted(list(extended_indices))
-    if len(extended_indices) > num_sentences + 4:
-        sorted_extended = sorted(extended_indices, key=lambda i: similarities[i], reverse=True)
-        extended_indices = sorted(sorted_extended[:num_sentences + 4])
-    selected_context = " ".join([sentences[i] for i in extended_indices])
-    return selected_context
+    return new_duplicate_index(existing_questions, threshold).is_duplicate(new_question)
 
-def generate_descriptive_answer(question, context, model, tokenizer):
-    selected_context = select_relevant_sentences(question, context, num_sentences=8)
+def select_relevant_sentences(question, context, num_sentences=8, index=None):
+    index = index or get_document_index(context, embedding_cache)
+    return index.select_relevant(question, num_sentences=num_sentences)
+
+def descriptive_answer_prompt(question, selected_context):
     prompt_templates = [
         f"Answer this question in detail based on the given information. Question: {question} Context: {selected_context} Answer:",
         f"Using only the provided context, answer this question thoroughly. Question: {question} Context: {selected_context} Answer:",
         f"Based on the following information, provide a comprehensive answer to this question. Question: {question} Context: {selected_context} Answer:"
     ]
-    prompt = random.choice(prompt_templates)
-    encoding = tokenizer.encode_plus(prompt, max_length=768, pad_to_max_length=False, 
-                                    truncation=True, return_tensors="pt").to(device)
-    input_ids, attention_mask = encoding["input_ids"], encoding["attention_mask"]
-    outs = model.generate(input_ids=input_ids,
-                         attention_mask=attention_mask,
-                         early_stopping=True,
-                         num_beams=5,
-                         length_penalty=1.5,
-                         no_repeat_ngram_size=3,
-                         min_length=50,
-                         max_length=250)
-    answer = tokenizer.decode(outs[0], skip_special_tokens=True)
+    return rng.choice(prompt_templates)
+
+def clean_descriptive_answer(answer):
     answer = postprocesstext(answer)
     answer = re.sub(r"^(The answer is|Answer:|Based on the context|According to the context)", "", answer).strip()
     answer = re.sub(r'([a-z])([A-Z])', r'\1 \2', answer)
     answer = re.sub(r'\.([a-zA-Z])', r'. \1', answer)
     return answer
 
-def assess_question_quality(question, answer, context):
+def generate_descriptive_answer(question, context, model, tokenizer):
+    return generate_descriptive_answers_batch([question], context, model, tokenizer, batch_size=1)[0]
+
+def generate_descriptive_answers_batch(questions, context, model, tokenizer, batch_size=None):
+    batch_size = batch_size or ANSWER_BATCH_SIZE
+    index = get_document_index(context, embedding_cache)
+    prompts = []
+    for question in questions:
+        selected_context = select_relevant_sentences(question, context, num_sentences=8, index=index)
+        prompts.append(descriptive_answer_prompt(question, selected_context))
+    # Sorting by prompt length keeps padding inside each batch to a minimum
+    lengths = [len(tokenizer.encode(p, max_length=768, truncation=True)) for p in prompts]
+    order = sorted(range(len(prompts)), key=lambda i: lengths[i])
+    answers = [None] * len(prompts)
+    for start in range(0, len(order), batch_size):
+        batch_indices = order[start:start + batch_size]
+        encoding = tokenizer([prompts[i] for i in batch_indices], max_length=768, padding=True,
+                             truncation=True, return_tensors="pt").to(device)
+        with torch.no_grad():
+            outs = model.generate(input_ids=encoding["input_ids"],
+                                  attention_mask=encoding["attention_mask"],
+                                  **generate_kwargs("answer"))
+        decoded = tokenizer.batch_decode(outs, skip_special_tokens=True)
+        for i, answer in zip(batch_indices, decoded):
+            answers[i] = clean_descriptive_answer(answer)
+    return answers
+
+def assess_question_quality(question, answer, context, index=None):
     if len(question.split()) < 3:
         return False, "Question too short"
     if len(answer.split()) < 8:
         return False, "Answer too short"
-    question_embedding = sentence_transformer_model.encode([question])
-    answer_embedding = sentence_transformer_model.encode([answer])
-    context_embedding = sentence_transformer_model.encode([context])
+    question_embedding = embedding_cache.encode([question])
+    answer_embedding = embedding_cache.encode([answer])
+    context_embedding = (index or get_document_index(context, embedding_cache)).context_embedding
     q_a_similarity = cosine_similarity(question_embedding, answer_embedding)[0][0]
     a_c_similarity = cosine_similarity(answer_embedding, context_embedding)[0][0]
     if q_a_similarity < 0.15:
@@ -487,7 +601,7 @@ def assess_question_quality(question, answer, context):
         return False, "Formatting issues detected"
     sentences = sent_tokenize(answer)
     if len(sentences) >= 3:
-        sentence_embeddings = sentence_transformer_model.encode(sentences)
+        sentence_embeddings = embedding_cache.encode(sentences)
         avg_similarity = 0
         comparisons = 0
         for i in range(len(sentences)):
@@ -502,182 +616,326 @@ def assess_question_quality(question, answer, context):
 
 def download_and_load_models():
     global s2v, summary_model, summary_tokenizer, question_model, question_tokenizer, answer_model, answer_tokenizer, sentence_transformer_model
+    # Fails fast, before loading anything, if prepare_resources.py has not run
+    resources.check_resources()
     print("Loading sentence transformer model...")
-    if os.path.exists("sentence_transformer_model.pkl"):
-        with open("sentence_transformer_model.pkl", 'rb') as f:
-            sentence_transformer_model = pickle.load(f)
-    else:
-        sentence_transformer_model = SentenceTransformer("sentence-transformers/msmarco-distilbert-base-v2")
-        with open("sentence_transformer_model.pkl", 'wb') as f:
-            pickle.dump(sentence_transformer_model, f)
-    print("Loading sense2vec model...")
-    if os.path.exists('s2v_old') and os.path.isdir('s2v_old'):
-        try:
-            s2v = Sense2Vec().from_disk('s2v_old')
-            print("Successfully loaded existing sense2vec model from s2v_old")
-        except Exception as e:
-            print(f"Error loading existing model: {e}")
-            print("Will download and extract the model again")
-            if os.path.exists('s2v_old'):
-                import shutil
-                if os.path.exists('s2v_old_backup'):
-                    shutil.rmtree('s2v_old_backup')
-                os.rename('s2v_old', 's2v_old_backup')
-            import gdown
-            import tarfile
-            url = 'https://github.com/explosion/sense2vec/releases/download/v1.0.0/s2v_reddit_2015_md.tar.gz'
-            gdown.download(url, 's2v_reddit_2015_md.tar.gz', quiet=False)
-            with tarfile.open('s2v_reddit_2015_md.tar.gz', "r:gz") as tar:
-                tar.extractall(path="./")
-            extracted_files = os.listdir("./")
-            s2v_dir = None
-            for item in extracted_files:
-                if os.path.isdir(item) and (item.startswith("s2v_") and item != 's2v_old'):
-                    s2v_dir = item
-                    break
-            if s2v_dir:
-                if os.path.exists('s2v_old'):
-                    import shutil
-                    shutil.rmtree('s2v_old')
-                os.rename(s2v_dir, 's2v_old')
-            s2v = Sense2Vec().from_disk('s2v_old')
-    else:
-        import gdown
-        import tarfile
-        url = 'https://github.com/explosion/sense2vec/releases/download/v1.0.0/s2v_reddit_2015_md.tar.gz'
-        gdown.download(url, 's2v_reddit_2015_md.tar.gz', quiet=False)
-        with tarfile.open('s2v_reddit_2015_md.tar.gz', "r:gz") as tar:
-            tar.extractall(path="./")
-        extracted_files = os.listdir("./")
-        s2v_dir = None
-        for item in extracted_files:
-            if os.path.isdir(item) and (item.startswith("s2v_") and item != 's2v_old'):
-                s2v_dir = item
-                break
-        if s2v_dir:
-            if os.path.exists('s2v_old'):
-                import shutil
-                shutil.rmtree('s2v_old')
-            os.rename(s2v_dir, 's2v_old')
-        s2v = Sense2Vec().from_disk('s2v_old')
+    sentence_transformer_model = model_store.load_sentence_transformer("sentence_transformer")
+    embedding_cache.model = sentence_transformer_model
+    # s2v is the memory-mapped sense2vec distractor index; the full Sense2Vec
+    # model is only loaded by prepare_resources.py to build it
+    print("Loading sense2vec distractor index...")
+    s2v = distractor_index.load_index()
     print("Loading summary model...")
-    if os.path.exists("t5_summary_model.pkl"):
-        with open('t5_summary_model.pkl', 'rb') as f:
-            summary_model = pickle.load(f)
-    else:
-        summary_model = T5ForConditionalGeneration.from_pretrained('t5-base')
-        with open("t5_summary_model.pkl", 'wb') as f:
-            pickle.dump(summary_model, f)
-    print("Loading summary tokenizer...")
-    if os.path.exists("t5_summary_tokenizer.pkl"):
-        with open('t5_summary_tokenizer.pkl', 'rb') as f:
-            summary_tokenizer = pickle.load(f)
-    else:
-        summary_tokenizer = T5Tokenizer.from_pretrained('t5-base')
-        with open("t5_summary_tokenizer.pkl", 'wb') as f:
-            pickle.dump(summary_tokenizer, f)
+    summary_model, summary_tokenizer = model_store.load_t5("t5_summary")
     print("Loading question model...")
-    if os.path.exists("t5_question_model.pkl"):
-        with open('t5_question_model.pkl', 'rb') as f:
-            question_model = pickle.load(f)
-    else:
-        question_model = T5ForConditionalGeneration.from_pretrained('ramsrigouthamg/t5_squad_v1')
-        with open("t5_question_model.pkl", 'wb') as f:
-            pickle.dump(question_model, f)
-    print("Loading question tokenizer...")
-    if os.path.exists("t5_question_tokenizer.pkl"):
-        with open('t5_question_tokenizer.pkl', 'rb') as f:
-            question_tokenizer = pickle.load(f)
-    else:
-        question_tokenizer = T5Tokenizer.from_pretrained('ramsrigouthamg/t5_squad_v1')
-        with open("t5_question_tokenizer.pkl", 'wb') as f:
-            pickle.dump(question_tokenizer, f)
+    question_model, question_tokenizer = model_store.load_t5("t5_question")
     print("Loading answer model...")
-    if os.path.exists("t5_answer_model.pkl"):
-        with open('t5_answer_model.pkl', 'rb') as f:
-            answer_model = pickle.load(f)
-    else:
-        answer_model = T5ForConditionalGeneration.from_pretrained('google/flan-t5-large')
-        with open("t5_answer_model.pkl", 'wb') as f:
-            pickle.dump(answer_model, f)
-    print("Loading answer tokenizer...")
-    if os.path.exists("t5_answer_tokenizer.pkl"):
-        with open('t5_answer_tokenizer.pkl', 'rb') as f:
-            answer_tokenizer = pickle.load(f)
-    else:
-        answer_tokenizer = T5Tokenizer.from_pretrained('google/flan-t5-large')
-        with open("t5_answer_tokenizer.pkl", 'wb') as f:
-            pickle.dump(answer_tokenizer, f)
-    summary_model = summary_model.to(device)
-    question_model = question_model.to(device)
-    answer_model = answer_model.to(device)
+    answer_model, answer_tokenizer = model_store.load_t5("t5_answer")
+    summary_model = inference_backends.prepare_model("t5_summary", summary_model.to(device))
+    question_model = inference_backends.prepare_model("t5_question", question_model.to(device))
+    answer_model = inference_backends.prepare_model("t5_answer", answer_model.to(device))
     print("All models loaded successfully!")
 
-def get_mcq_questions(context, max_questions=10) -> List[Dict]:
-    global s2v, summary_model, summary_tokenizer, question_model, question_tokenizer, sentence_transformer_model
-    if s2v is None or summary_model is None:
-        download_and_load_models()
-    chunks = preprocess_context(context)
-    summarized_text = summarizer(context, summary_model, summary_tokenizer)
-    imp_keywords = get_keywords(context)
-    entities = []
-    doc = nlp(context)
-    for ent in doc.ents:
-        if ent.label_ in ["PERSON", "ORG", "GPE", "LOC", "PRODUCT", "EVENT", "DATE"]:
-            entities.append(ent.text)
-    all_answers = list(set(imp_keywords + entities))
-    random.shuffle(all_answers)
-    qualified_questions = []
-    for answer in all_answers:
-        if len(qualified_questions) >= max_questions:
-            break
+_models_lock = threading.Lock()
+
+def ensure_models_loaded():
+    with _models_lock:
+        if any(m is None for m in (s2v, summary_model, question_model, answer_model, sentence_transformer_model)):
+            download_and_load_models()
+
+def set_thread_budget(num_threads):
+    # torch.set_num_threads sets the OpenMP thread count of the calling thread,
+    # but also stores a process-wide value that a thread's first parallel
+    # region re-applies (at::internal::lazy_init_num_threads). Calling
+    # get_num_threads first runs that lazy initialisation, so the budget set
+    # afterwards is the one this thread keeps. Returns the effective count.
+    torch.get_num_threads()
+    torch.set_num_threads(max(1, int(num_threads)))
+    return get_thread_budget()
+
+def get_thread_budget():
+    return torch.get_num_threads()
+
+def track_embedding_stats():
+    # Context manager counting the embedding cache lookups of the calling thread
+    return embedding_cache.track()
+
+def log_embedding_cache_stats(label, stats):
+    hits = stats["hits"] + stats["disk_hits"]
+    misses = stats["misses"]
+    print(f"{label}: embedding cache {hits} hits, {misses} misses")
+    return {"hits": hits, "misses": misses}
+
+class DocumentAnalysis:
+    # Per-document preprocessing shared by the MCQ and descriptive generators.
+    # Every stage is computed lazily, at most once, and is safe to read from
+    # several generator threads at the same time.
+    def __init__(self, text):
+        self.text = text
+        self.content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        self.values = {}
+        self.lock = threading.RLock()
+
+    def memoized(self, name, compute):
+        with self.lock:
+            if name not in self.values:
+                self.values[name] = compute()
+            return self.values[name]
+
+    @property
+    def chunks(self):
+        return self.memoized("chunks", lambda: preprocess_context(self.text))
+
+    @property
+    def summary(self):
+        def compute():
+            if active_profile()["summary_mode"] == "fast" and self.chunks:
+                return " ".join(self.chunks[:2])
+            try:
+                return summarize_document(self.text, summary_model, summary_tokenizer, chunks=self.chunks)
+            except:
+                return " ".join(self.chunks[:2])
+        # Summaries depend on the generation profile of the calling thread
+        return self.memoized(f"summary:{active_profile_name()}", compute)
+
+    @property
+    def keywords(self):
+        return self.keyword_extraction[0]
+
+    @property
+    def keyword_report(self):
+        # Engine, timing and whether the frequency fallback was used
+        return self.keyword_extraction[1]
+
+    @property
+    def keyword_extraction(self):
+        return self.memoized("keywords", lambda: keyword_engines.extract_keywords(self))
+
+    @property
+    def doc(self):
+        return self.memoized("doc", lambda: nlp_service.parse(self.text))
+
+    @property
+    def entities(self):
+        return self.memoized("entities", lambda: [(ent.text, ent.label_) for ent in self.doc.ents])
+
+    @property
+    def sentences(self):
+        return self.memoized("sentences", lambda: sent_tokenize(self.text))
+
+    @property
+    def index(self):
+        return self.memoized("index", lambda: get_document_index(self.text, embedding_cache))
+
+    @property
+    def embeddings(self):
+        return self.index.embeddings
+
+    def prepare(self):
+        for name in ("chunks", "summary", "keywords", "entities"):
+            getattr(self, name)
+        return self
+
+_analyses = OrderedDict()
+_analyses_lock = threading.Lock()
+
+def get_document_analysis(text):
+    content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    with _analyses_lock:
+        analysis = _analyses.get(content_hash)
+        if analysis is None:
+            analysis = DocumentAnalysis(text)
+            _analyses[content_hash] = analysis
+        _analyses.move_to_end(content_hash)
+        while len(_analyses) > ANALYSIS_CACHE_SIZE:
+            _analyses.popitem(last=False)
+    return analysis
+
+# Entity types that make good MCQ answers, weighted by how well they tend to work
+MCQ_ENTITY_WEIGHTS = {"PERSON": 1.0, "ORG": 1.0, "EVENT": 1.0, "GPE": 0.9, "LOC": 0.9, "PRODUCT": 0.8, "DATE": 0.5}
+
+def distractor_availability(word, sense2vecmodel):
+    # Lookups only: no similarity search and no embeddings
+    try:
+        if sense2vecmodel is not None and sense2vecmodel.get_best_sense(word, senses=S2V_SENSES):
+            return 1.0
+    except:
+        pass
+    try:
+        synsets = wn.synsets(word, 'n')
+        if synsets and synsets[0].hypernyms():
+            return 0.7
+    except:
+        pass
+    return 0.0
+
+def rank_mcq_candidates(analysis, sense2vecmodel):
+    # Scores every keyword and entity by keyword rank, entity type, how well the
+    # document covers it and whether distractors can be found for it, without
+    # running any model. Returns (relevant_context, answer) pairs, best first.
+    keywords = analysis.keywords
+    keyword_ranks = {}
+    for rank, keyword in enumerate(keywords):
+        keyword_ranks.setdefault(keyword, rank)
+    entity_labels = {}
+    for text, label in analysis.entities:
+        if label in MCQ_ENTITY_WEIGHTS:
+            entity_labels.setdefault(text, label)
+    chunks = analysis.chunks
+    lowered_chunks = [chunk.lower() for chunk in chunks]
+    lowered_text = analysis.text.lower()
+    scored = []
+    # Sorted, so the rng tie-breaks are drawn in the same order in every process
+    # (set order depends on PYTHONHASHSEED)
+    for answer in sorted(set(keyword_ranks) | set(entity_labels)):
         if len(answer) < 2 or all(c in string.punctuation for c in answer):
             continue
+        lowered = answer.lower()
         relevant_context = ""
-        for chunk in chunks:
-            if answer.lower() in chunk.lower():
+        for chunk, lowered_chunk in zip(chunks, lowered_chunks):
+            if lowered in lowered_chunk:
                 relevant_context = chunk
                 break
-        if not relevant_context:
-            relevant_context = summarized_text
-        question = get_improved_question(relevant_context, answer, question_model, question_tokenizer)
-        if not question or len(question.split()) < 4 or question.lower().startswith("what question"):
-            continue
-        distractors = get_improved_distractors(answer, relevant_context, s2v, sentence_transformer_model)
-        if len(distractors) < 3:
+        keyword_score = 1 - keyword_ranks[answer] / len(keywords) if answer in keyword_ranks else 0.0
+        entity_score = MCQ_ENTITY_WEIGHTS.get(entity_labels.get(answer), 0.0)
+        coverage_score = (0.5 if relevant_context else 0.0) + min(lowered_text.count(lowered), 3) / 6
+        availability_score = distractor_availability(answer, sense2vecmodel)
+        score = 0.35 * keyword_score + 0.25 * entity_score + 0.2 * coverage_score + 0.2 * availability_score
+        # The random tie-break keeps seeded runs reproducible while varying equal-score picks
+        scored.append((score, rng.random(), relevant_context or analysis.summary, answer))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [(relevant_context, answer) for _, _, relevant_context, answer in scored]
+
+def get_mcq_questions(context, max_questions=10, batch_size=None, analysis=None, on_question=None, exclude=(), subject=None, check=None) -> List[Dict]:
+    global s2v, summary_model, summary_tokenizer, question_model, question_tokenizer, sentence_transformer_model
+    ensure_models_loaded()
+    analysis = analysis or get_document_analysis(context)
+    candidates = rank_mcq_candidates(analysis, s2v)
+    # Cached per answer, sense and subject; the sense2vec neighbours of the
+    # misses are found in one pass over the distractor index
+    distractor_stats = {"hits": 0, "misses": 0}
+    pools = get_distractor_pools([answer for _, answer in candidates], s2v, subject, stats=distractor_stats)
+
+    # Distractors do not depend on the generated question, so candidates without
+    # three distractors are dropped before they reach the question model.
+    def viable_candidates():
+        for relevant_context, answer in candidates:
+            distractors = get_improved_distractors(answer, relevant_context, s2v, sentence_transformer_model, pool=pools[answer])
+            if len(distractors) >= 3:
+                yield relevant_context, answer, distractors[:3]
+
+    batch_size = batch_size or QUESTION_BATCH_SIZE
+    viable = viable_candidates()
+    qualified_questions = []
+    duplicate_index = new_duplicate_index(exclude)
+    generated_count = 0
+    while len(qualified_questions) < max_questions:
+        # check, when given, runs before every round and raises to stop early
+        if check:
+            check()
+        # Only the best-ranked viable candidates, the profile's over-generation
+        # factor per question still needed, go through the question model in each round
+        needed = max_questions - len(qualified_questions)
+        batch = list(islice(viable, min(batch_size, math.ceil(needed * active_profile()["mcq_overgeneration"]))))
+        if not batch:
+            break
+        generated = get_improved_questions_batch([(c, a) for c, a, _ in batch], question_model, question_tokenizer, batch_size=batch_size)
+        generated_count += len(batch)
+        for (relevant_context, answer, distractors), question in zip(batch, generated):
+            if len(qualified_questions) >= max_questions:
+                break
+            if not question or len(question.split()) < 4 or question.lower().startswith("what question"):
+                continue
+            if duplicate_index.is_duplicate(question):
+                continue
+            difficulty, similarity_score = assess_question_difficulty(answer, distractors, sentence_transformer_model)
+            question_data = {
+                "question": question,
+                "options": [answer] + distractors,
+                "correct": answer,
+                "correct_index": 0,
+                "context": relevant_context,
+                "difficulty": difficulty
+            }
+            rng.shuffle(question_data["options"])
+            question_data["correct_index"] = question_data["options"].index(answer)
+            qualified_questions.append(question_data)
+            duplicate_index.add(question)
+            if on_question:
+                on_question(question_data)
+    print(f"MCQ generation: {len(candidates)} candidates ranked, {generated_count} sent to the question model, "
+          f"{len(qualified_questions)} accepted")
+    print(f"MCQ generation: distractor cache {distractor_stats['hits']} hits, {distractor_stats['misses']} misses")
+    return qualified_questions
+
+def build_descriptive_question_data(question, answer, source_context):
+    num_sentences = nlp_service.count_sentences(answer)
+    avg_sentence_length = len(answer.split()) / max(1, num_sentences)
+    complexity_score = min(100, (avg_sentence_length * 2) + (num_sentences * 3))
+    return {
+        "question": question,
+        "answer": answer,
+        "complexity": int(complexity_score),
+        "context": source_context,
+        "difficulty": "Medium" if complexity_score < 60 else "Hard"
+    }
+
+def collect_descriptive_questions(sources, context, qualified_questions, max_questions, batch_size=None, duplicate_index=None, on_question=None, check=None):
+    # Each round first generates and de-duplicates the candidate questions still
+    # needed, then answers them together, and only then runs quality assessment.
+    # check, when given, runs before each of those steps and raises to stop early.
+    if duplicate_index is None:
+        duplicate_index = new_duplicate_index(qualified_questions)
+    index = get_document_index(context, embedding_cache)
+    sources = iter(sources)
+    while len(qualified_questions) < max_questions:
+        if check:
+            check()
+        needed = max_questions - len(qualified_questions)
+        candidates = []
+        round_index = new_duplicate_index()
+        for source in sources:
+            try:
+                question = generate_descriptive_question(source, question_model, question_tokenizer)
+                if duplicate_index.is_duplicate(question) or not round_index.add_if_new(question):
+                    continue
+                candidates.append({"question": question, "context": source})
+            except:
+                continue
+            if len(candidates) >= needed:
+                break
+        if not candidates:
+            break
+        if check:
+            check()
+        try:
+            answers = generate_descriptive_answers_batch([c["question"] for c in candidates], context,
+                                                         answer_model, answer_tokenizer, batch_size=batch_size)
+        except:
             continue
-        distractors = distractors[:3]
-        difficulty, similarity_score = assess_question_difficulty(answer, distractors, sentence_transformer_model)
-        question_data = {
-            "question": question,
-            "options": [answer] + distractors,
-            "correct": answer,
-            "correct_index": 0,
-            "context": relevant_context,
-            "difficulty": difficulty
-        }
-        random.shuffle(question_data["options"])
-        question_data["correct_index"] = question_data["options"].index(answer)
-        qualified_questions.append(question_data)
+        for candidate, answer in zip(candidates, answers):
+            try:
+                is_good, reason = assess_question_quality(candidate["question"], answer, context, index=index)
+                if not is_good:
+                    continue
+                question_data = build_descriptive_question_data(candidate["question"], answer, candidate["context"])
+            except:
+                continue
+            qualified_questions.append(question_data)
+            duplicate_index.add(candidate["question"])
+            if on_question:
+                on_question(question_data)
     return qualified_questions
 
-def get_descriptive_questions(context, max_questions=10) -> List[Dict]:
+def get_descriptive_questions(context, max_questions=10, batch_size=None, analysis=None, on_question=None, exclude=(), check=None) -> List[Dict]:
     global s2v, summary_model, summary_tokenizer, question_model, question_tokenizer, answer_model, answer_tokenizer, sentence_transformer_model
-    if summary_model is None or question_model is None or answer_model is None or sentence_transformer_model is None:
-        download_and_load_models()
-    chunks = preprocess_context(context)
+    ensure_models_loaded()
+    analysis = analysis or get_document_analysis(context)
+    chunks = analysis.chunks
+    summarized_text = analysis.summary
+    keywords = analysis.keywords
     try:
-        summarized_text = summarizer(context, summary_model, summary_tokenizer)
-    except:
-        summarized_text = " ".join(chunks[:2])
-    try:
-        keywords = get_keywords(context)
-    except:
-        words = context.lower().split()
-        words = [w for w in words if w not in stopwords.words('english') and len(w) > 3]
-        keywords = [word for word, _ in Counter(words).most_common(15)]
-    try:
-        key_segments = extract_key_segments(context, keywords)
+        key_segments = extract_key_segments(context, keywords, sentences=analysis.sentences)
     except:
         key_segments = chunks[:max_questions]
     if len(key_segments) < max_questions * 2:
@@ -687,65 +945,24 @@ def get_descriptive_questions(context, max_questions=10) -> List[Dict]:
                 key_segments.append(chunk)
                 more_needed -= 1
     if len(key_segments) < max_questions * 2:
-        sentences = sent_tokenize(context)
+        sentences = analysis.sentences
         for i in range(0, len(sentences), 3):
             if i + 3 <= len(sentences) and len(key_segments) < max_questions * 2:
                 segment = " ".join(sentences[i:i+3])
                 if segment not in key_segments and 40 <= len(segment.split()) <= 250:
                     key_segments.append(segment)
-    random.shuffle(key_segments)
+    rng.shuffle(key_segments)
     qualified_questions = []
-    for segment in key_segments:
-        if len(qualified_questions) >= max_questions:
-            break
-        try:
-            question = generate_descriptive_question(segment, question_model, question_tokenizer)
-            if is_duplicate(question, qualified_questions):
-                continue
-            answer = generate_descriptive_answer(question, context, answer_model, answer_tokenizer)
-            is_good, reason = assess_question_quality(question, answer, context)
-            if is_good:
-                doc = nlp(answer)
-                num_sentences = len(list(doc.sents))
-                avg_sentence_length = len(answer.split()) / max(1, num_sentences)
-                complexity_score = min(100, (avg_sentence_length * 2) + (num_sentences * 3))
-                question_data = {
-                    "question": question,
-                    "answer": answer,
-                    "complexity": int(complexity_score),
-                    "context": segment,
-                    "difficulty": "Medium" if complexity_score < 60 else "Hard"
-                }
-                qualified_questions.append(question_data)
-        except:
-            continue
+    duplicate_index = new_duplicate_index(exclude)
+    collect_descriptive_questions(key_segments, context, qualified_questions, max_questions, batch_size, duplicate_index, on_question, check)
     if len(qualified_questions) < max_questions:
-        for _ in range(min(5, max_questions - len(qualified_questions))):
-            try:
-                question = generate_descriptive_question(summarized_text, question_model, question_tokenizer)
-                if is_duplicate(question, qualified_questions):
-                    continue
-                answer = generate_descriptive_answer(question, context, answer_model, answer_tokenizer)
-                is_good, reason = assess_question_quality(question, answer, context)
-                if is_good:
-                    doc = nlp(answer)
-                    num_sentences = len(list(doc.sents))
-                    avg_sentence_length = len(answer.split()) / max(1, num_sentences)
-                    complexity_score = min(100, (avg_sentence_length * 2) + (num_sentences * 3))
-                    question_data = {
-                        "question": question,
-                        "answer": answer,
-                        "complexity": int(complexity_score),
-                        "context": summarized_text,
-                        "difficulty": "Medium" if complexity_score < 60 else "Hard"
-                    }
-                    qualified_questions.append(question_data)
-            except:
-                continue
+        fallback_sources = [summarized_text] * min(5, max_questions - len(qualified_questions))
+        collect_descriptive_questions(fallback_sources, context, qualified_questions, max_questions, batch_size, duplicate_index, on_question, check)
     return qualified_questions
 
 def extract_text_from_pdf(pdf_path: str) -> str:
     try:
+        import pdfplumber
         text = ""
         with pdfplumber.open(pdf_path) as pdf:
             for page in pdf.pages:
@@ -762,8 +979,14 @@ def extract_text_from_pdf(pdf_path: str) -> str:
         print(f"Error reading PDF: {e}")
         return ""
 
-def generate_mcqs(text: str, num_mcqs: int) -> List[Dict]:
-    return get_mcq_questions(text, max_questions=num_mcqs)
+def generate_mcqs(text: str, num_mcqs: int, analysis: Optional[DocumentAnalysis] = None,
+                  on_question: Optional[Callable[[Dict], None]] = None, exclude: List[str] = (),
+                  subject: Optional[str] = None, check: Optional[Callable[[], None]] = None) -> List[Dict]:
+    return get_mcq_questions(text, max_questions=num_mcqs, analysis=analysis, on_question=on_question, exclude=exclude,
+                             subject=subject, check=check)
 
-def generate_descriptive_questions(text: str, num_descriptive: int) -> List[Dict]:
-    return get_descriptive_questions(text, max_questions=num_descriptive)
\ No newline at end of file
+def generate_descriptive_questions(text: str, num_descriptive: int, analysis: Optional[DocumentAnalysis] = None,
+                                   on_question: Optional[Callable[[Dict], None]] = None, exclude: List[str] = (),
+                                   check: Optional[Callable[[], None]] = None) -> List[Dict]:
+    return get_descriptive_questions(text, max_questions=num_descriptive, analysis=analysis, on_question=on_question,
+                                     exclude=exclude, check=check)
\ No newline at end of file
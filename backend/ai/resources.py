@@ -0,0 +1,183 @@
+import json
+import os
+import shutil
+import tarfile
+
+# Everything the generators need besides Python packages (NLTK data, the spaCy
+# model, the sense2vec vectors and the model weights) is installed ahead of
+# time by `python prepare_resources.py` into RESOURCE_DIR and the model store,
+# and recorded in a manifest. At runtime the manifest and the files are only
+# checked: nothing is downloaded and no subprocess is started, and a missing
+# resource fails fast with an error that says how to install it. This module
+# imports nothing heavy at load time, so the API can use it too.
+RESOURCE_DIR = os.getenv(
+    'RESOURCE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources')
+)
+RESOURCE_MANIFEST = os.path.join(RESOURCE_DIR, 'manifest.json')
+NLTK_DIR = os.path.join(RESOURCE_DIR, 'nltk_data')
+SPACY_MODEL = "en_core_web_sm"
+SPACY_DIR = os.path.join(RESOURCE_DIR, SPACY_MODEL)
+S2V_DIR = os.path.join(RESOURCE_DIR, 's2v_old')
+S2V_URL = 'https://github.com/explosion/sense2vec/releases/download/v1.0.0/s2v_reddit_2015_md.tar.gz'
+# Where older setups extracted sense2vec (the working directory of the worker)
+LEGACY_S2V_DIR = 's2v_old'
+
+NLTK_PACKAGES = {
+    "punkt": "tokenizers/punkt",
+    "wordnet": "corpora/wordnet",
+    "stopwords": "corpora/stopwords",
+    "omw-1.4": "corpora/omw-1.4",
+}
+# Model store entries loaded by download_and_load_models
+MODEL_ENTRIES = ["t5_summary", "t5_question", "t5_answer", "sentence_transformer", "s2v_index"]
+
+def model_entries():
+    # MODEL_ENTRIES plus the ONNX exports of the models whose configured
+    # inference backend is onnx
+    from ai import inference_backends
+    return MODEL_ENTRIES + inference_backends.onnx_entries()
+
+class MissingResources(RuntimeError):
+    pass
+
+def missing_message(missing):
+    return (f"Missing generation resources: {', '.join(missing)}. Install them with "
+            f"`python prepare_resources.py` in backend/ (or run it on a machine with network access "
+            f"and copy {RESOURCE_DIR} and the model store).")
+
+def load_manifest():
+    if not os.path.exists(RESOURCE_MANIFEST):
+        return {}
+    with open(RESOURCE_MANIFEST, 'r') as f:
+        return json.load(f)
+
+def save_manifest(manifest):
+    os.makedirs(RESOURCE_DIR, exist_ok=True)
+    tmp_path = f"{RESOURCE_MANIFEST}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, RESOURCE_MANIFEST)
+
+def nltk_resource_exists(path):
+    # NLTK data is installed either unpacked or as the downloaded .zip
+    full_path = os.path.join(NLTK_DIR, path)
+    return os.path.exists(full_path) or os.path.exists(full_path + ".zip")
+
+def configure_nltk():
+    import nltk
+    if NLTK_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DIR)
+
+def check_resources(models=True):
+    # Manifest and file checks only; raises MissingResources
+    from ai import model_store
+    manifest = load_manifest()
+    missing = []
+    for package, path in NLTK_PACKAGES.items():
+        if package not in manifest.get("nltk", {}) or not nltk_resource_exists(path):
+            missing.append(f"nltk:{package}")
+    if "spacy" not in manifest or not os.path.exists(os.path.join(SPACY_DIR, "meta.json")):
+        missing.append(f"spacy:{SPACY_MODEL}")
+    if models:
+        for name in model_entries():
+            if not model_store.verify_entry(name):
+                missing.append(f"model:{name}")
+    if missing:
+        raise MissingResources(missing_message(missing))
+    return manifest
+
+def load_spacy():
+    import spacy
+    if not os.path.exists(os.path.join(SPACY_DIR, "meta.json")):
+        raise MissingResources(missing_message([f"spacy:{SPACY_MODEL}"]))
+    return spacy.load(SPACY_DIR)
+
+def load_sense2vec():
+    from sense2vec import Sense2Vec
+    if not os.path.isdir(S2V_DIR):
+        raise MissingResources(missing_message(["sense2vec"]))
+    return Sense2Vec().from_disk(S2V_DIR)
+
+# Installation, used by prepare_resources.py only
+
+def prepare_nltk():
+    import nltk
+    os.makedirs(NLTK_DIR, exist_ok=True)
+    installed = {}
+    for package, path in NLTK_PACKAGES.items():
+        if not nltk_resource_exists(path):
+            print(f"Installing NLTK data '{package}'...")
+            if not nltk.download(package, download_dir=NLTK_DIR, quiet=True, raise_on_error=True):
+                raise MissingResources(f"Could not download NLTK data '{package}'")
+        installed[package] = path
+    return installed
+
+def prepare_spacy():
+    import spacy
+    if not os.path.exists(os.path.join(SPACY_DIR, "meta.json")):
+        try:
+            nlp = spacy.load(SPACY_MODEL)
+        except OSError:
+            print(f"Installing spaCy model '{SPACY_MODEL}'...")
+            from spacy.cli import download
+            download(SPACY_MODEL)
+            import importlib
+            nlp = importlib.import_module(SPACY_MODEL).load()
+        nlp.to_disk(SPACY_DIR)
+    with open(os.path.join(SPACY_DIR, "meta.json"), 'r') as f:
+        meta = json.load(f)
+    return {"model": SPACY_MODEL, "version": meta.get("version"), "spacy_version": meta.get("spacy_version")}
+
+def prepare_sense2vec():
+    if os.path.isdir(S2V_DIR):
+        return {"source": S2V_URL}
+    os.makedirs(RESOURCE_DIR, exist_ok=True)
+    if os.path.isdir(LEGACY_S2V_DIR):
+        print(f"Copying sense2vec vectors from {os.path.abspath(LEGACY_S2V_DIR)}...")
+        shutil.copytree(LEGACY_S2V_DIR, S2V_DIR)
+        return {"source": S2V_URL}
+    import urllib.request
+    archive = os.path.join(RESOURCE_DIR, 's2v_reddit_2015_md.tar.gz')
+    print(f"Downloading {S2V_URL}...")
+    urllib.request.urlretrieve(S2V_URL, archive)
+    extract_dir = os.path.join(RESOURCE_DIR, 's2v_extract')
+    with tarfile.open(archive, "r:gz") as tar:
+        tar.extractall(path=extract_dir)
+    extracted = [item for item in os.listdir(extract_dir) if os.path.isdir(os.path.join(extract_dir, item))]
+    if not extracted:
+        raise MissingResources(f"No sense2vec vectors found in {S2V_URL}")
+    os.replace(os.path.join(extract_dir, extracted[0]), S2V_DIR)
+    shutil.rmtree(extract_dir)
+    os.remove(archive)
+    return {"source": S2V_URL}
+
+def prepare_models(onnx=False):
+    # onnx=True exports every T5 model to ONNX, not only those configured for it
+    from ai import distractor_index, inference_backends, model_store
+    for name in ("t5_summary", "t5_question", "t5_answer"):
+        if not model_store.verify_entry(name):
+            model_store.fetch_t5(name)
+    if not model_store.verify_entry("sentence_transformer"):
+        model_store.fetch_sentence_transformer("sentence_transformer")
+    if not model_store.verify_entry(distractor_index.INDEX_NAME):
+        print("Building sense2vec distractor index...")
+        distractor_index.build_index(load_sense2vec())
+    entries = model_entries()
+    for name in inference_backends.T5_MODELS:
+        entry = inference_backends.onnx_entry(name)
+        if onnx and entry not in entries:
+            entries.append(entry)
+        if entry in entries and not model_store.verify_entry(entry):
+            inference_backends.export_onnx(name)
+    return {name: model_store.load_manifest()[name]["source"] for name in entries}
+
+def prepare_resources(onnx=False):
+    manifest = load_manifest()
+    manifest["nltk"] = prepare_nltk()
+    manifest["spacy"] = prepare_spacy()
+    manifest["sense2vec"] = prepare_sense2vec()
+    save_manifest(manifest)
+    manifest["models"] = prepare_models(onnx=onnx)
+    save_manifest(manifest)
+    return manifest
@@ -1,24 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
 from jwt import decode, encode, ExpiredSignatureError
 from bcrypt import hashpw, gensalt, checkpw
 from dotenv import load_dotenv
 from uuid import uuid4
 import os
-import pdfplumber
+import json
 from datetime import datetime, timedelta
 import logging
 import smtplib
 from email.mime.text import MIMEText
 import random
-import spacy
 import time
 from bson.objectid import ObjectId
-# from ai.test import generate_mcqs, generate_descriptive_questions
-from ai.question_generator import generate_mcqs,generate_descriptive_questions
 import threading
+from db import notes, submissions, users, questions, tests, token_requests, grading_vectors as grading_vectors_collection
+from job_queue import JobQueue, QueueFull
+from ai.profiles import PROFILES, GENERATION_PROFILE
+from ai import resources
+from grading import GradingVectors
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,24 +29,6 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": ["http://localhost:5173"], "supports_credentials": True}})
 
-# MongoDB Connection
-try:
-    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/qmaster'), 
-                         maxPoolSize=10, serverSelectionTimeoutMS=5000)
-    db = client['qmaster']
-    logger.info("MongoDB Connected")
-except ServerSelectionTimeoutError as e:
-    logger.error(f"MongoDB connection error: {e}")
-    exit(1)
-
-# Collections
-notes = db.notes
-submissions = db.submissions
-users = db.users
-questions = db.questions
-tests = db.tests
-token_requests = db.token_requests  # New collection for tracking token generation
-
 # OTP Store
 otps = {}
 
@@ -58,12 +40,35 @@ JWT_EXPIRATION = timedelta(hours=24)
 EMAIL_USER = os.getenv('EMAIL_USER')
 EMAIL_PASS = os.getenv('EMAIL_PASS')
 
-# spaCy for similarity comparison
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    logger.error("spaCy model 'en_core_web_sm' not found. Please install it using: python -m spacy download en_core_web_sm")
-    exit(1)
+# Generation runs in separate worker processes (python worker.py) by default.
+# GENERATION_MODE=inline runs the job queue workers inside the API process.
+GENERATION_MODE = os.getenv('GENERATION_MODE', 'worker')
+
+# Seconds an event stream waits for progress before sending a keep-alive
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+# Seconds between job document checks when generation runs in worker processes
+SSE_POLL_SECONDS = float(os.getenv('SSE_POLL_SECONDS', 2))
+# Lifetime of the ticket that opens an event stream. EventSource cannot send
+# headers, so the stream is opened with a short-lived ticket for one request
+# in the URL rather than with the teacher's JWT.
+EVENTS_TICKET_SECONDS = int(os.getenv('EVENTS_TICKET_SECONDS', 60))
+EVENTS_TICKET_ROLE = "event-ticket"
+EVENTS_TICKET_AUDIENCE = "token-events"
+
+# Answer similarity is graded with the shared spaCy pipeline in
+# ai.nlp_service against reference-answer vectors cached by question id
+# (grading.py). spaCy is loaded on first use rather than at import, so the API
+# starts without the ML stack; generation lives in generation.py and is only
+# imported by workers (or lazily in inline mode).
+grading_vectors = GradingVectors(grading_vectors_collection)
+
+def grade_answers(graded):
+    # Similarity of each (student answer, question document) pair
+    try:
+        return grading_vectors.grade(graded)
+    except resources.MissingResources as e:
+        logger.error(str(e))
+        raise
 
 def send_otp_email(to_email, otp, otp_type="registration"):
     try:
@@ -80,8 +85,12 @@ def send_otp_email(to_email, otp, otp_type="registration"):
         raise
 
 def authenticate(token):
+    # Login tokens only: event stream tickets carry an audience claim, which
+    # decode rejects when no audience is expected
     try:
         payload = decode(token, JWT_SECRET, algorithms=["HS256"])
+        if payload.get('role') == EVENTS_TICKET_ROLE:
+            return None
         return payload
     except ExpiredSignatureError:
         logger.error("JWT expired")
@@ -90,6 +99,17 @@ def authenticate(token):
         logger.error(f"Authentication error: {e}")
         return None
 
+def authenticate_ticket(ticket, request_id):
+    # Event stream tickets are only valid here, for the request they were issued for
+    try:
+        payload = decode(ticket, JWT_SECRET, algorithms=["HS256"], audience=EVENTS_TICKET_AUDIENCE)
+    except Exception as e:
+        logger.error(f"Event ticket rejected: {e}")
+        return None
+    if payload.get('role') != EVENTS_TICKET_ROLE or payload.get('request_id') != request_id:
+        return None
+    return payload
+
 def mongo_to_json(obj):
     if isinstance(obj, ObjectId):
         return str(obj)
@@ -97,77 +117,43 @@ def mongo_to_json(obj):
         return obj.isoformat()
     raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
-# Background processing function
-def process_content(request_id, input_type, subject, text_content, pdf_content, num_mcqs, num_descriptive, mcq_marks, descriptive_marks):
+class ProgressBroker:
+    # Wakes up event-stream handlers in this process when a generation job
+    # publishes progress, so they only read Mongo when something changed.
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.versions = {}
+
+    def publish(self, request_id):
+        with self.condition:
+            self.versions[request_id] = self.versions.get(request_id, 0) + 1
+            self.condition.notify_all()
+
+    def version(self, request_id):
+        with self.condition:
+            return self.versions.get(request_id, 0)
+
+    def wait(self, request_id, version, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.versions.get(request_id, 0) != version, timeout)
+            return self.versions.get(request_id, 0)
+
+    def finish(self, request_id):
+        self.publish(request_id)
+        with self.condition:
+            self.versions.pop(request_id, None)
+
+progress_broker = ProgressBroker()
+
+def process_inline(job, queue):
+    # Imported here so that the API process only loads the ML stack in inline mode
+    from generation import process_content
     try:
-        token_id = str(uuid4())
-        mcqs = []
-        descriptive = []
-
-        content_to_process = pdf_content if input_type == 'pdf' else text_content
-        if not content_to_process.strip():
-            token_requests.update_one(
-                {"request_id": request_id},
-                {"$set": {"status": "failed", "error": "No valid content to process for question generation"}}
-            )
-            return
-
-        logger.info(f"Generating {num_mcqs} MCQs for request_id {request_id}")
-        mcqs = generate_mcqs(content_to_process, num_mcqs)
-        logger.info(f"Generating {num_descriptive} descriptive questions for request_id {request_id}")
-        descriptive = generate_descriptive_questions(content_to_process, num_descriptive)
-
-        if not mcqs and not descriptive:
-            token_requests.update_one(
-                {"request_id": request_id},
-                {"$set": {"status": "failed", "error": "Failed to generate any questions"}}
-            )
-            return
-
-        questions_to_insert = []
-        for mcq in mcqs:
-            questions_to_insert.append({
-                "token": token_id,
-                "type": "mcq",
-                "question": mcq['question'],
-                "options": mcq['options'],
-                "correctAnswer": mcq['correct'],
-                "correctIndex": mcq.get('correct_index', 0),
-                "marks": mcq_marks,
-                "context": mcq['context'],
-                "difficulty": mcq['difficulty'],
-                "subject": subject
-            })
-        for desc in descriptive:
-            questions_to_insert.append({
-                "token": token_id,
-                "type": "descriptive",
-                "question": desc['question'],
-                "correctAnswer": desc['answer'],
-                "marks": descriptive_marks,
-                "pdfContent": pdf_content if input_type == 'pdf' else None,
-                "context": desc['context'],
-                "difficulty": desc['difficulty'],
-                "subject": subject
-            })
+        process_content(job, queue, notify=progress_broker.publish)
+    finally:
+        progress_broker.finish(job['request_id'])
 
-        if questions_to_insert:
-            questions.insert_many(questions_to_insert)
-            logger.info(f"Inserted {len(questions_to_insert)} questions for token {token_id}")
-        content_to_store = content_to_process
-        notes.insert_one({"token": token_id, "content": content_to_store, "createdAt": datetime.now(), "inputType": input_type, "subject": subject})
-        logger.info(f"Inserted note with token: {token_id}")
-
-        token_requests.update_one(
-            {"request_id": request_id},
-            {"$set": {"status": "completed", "token": token_id, "mcqs": mcqs, "descriptiveQuestions": descriptive}}
-        )
-    except Exception as e:
-        logger.error(f"Background processing failed for request_id {request_id}: {e}", exc_info=True)
-        token_requests.update_one(
-            {"request_id": request_id},
-            {"$set": {"status": "failed", "error": str(e)}}
-        )
+job_queue = JobQueue(token_requests, process_inline)
 
 @app.route('/api/setup-user', methods=['POST'])
 def setup_user():
@@ -475,6 +461,7 @@ def upload_content():
         pdf_file = request.files['pdf']
         logger.info(f"Processing PDF file: {pdf_file.filename}")
         try:
+            import pdfplumber
             with pdfplumber.open(pdf_file) as pdf:
                 pdf_content = ''.join(page.extract_text() or '' for page in pdf.pages)
             logger.info(f"Extracted PDF content length: {len(pdf_content)} characters")
@@ -495,25 +482,48 @@ def upload_content():
         num_descriptive = int(request.form.get('numDescriptive', 3))
         mcq_marks = float(request.form.get('mcqMarks', 2))
         descriptive_marks = float(request.form.get('descriptiveMarks', 10))
+        force_regenerate = request.form.get('forceRegenerate', 'false').lower() in ('true', '1', 'yes')
+        profile = request.form.get('profile', GENERATION_PROFILE).lower()
+        if profile not in PROFILES:
+            return jsonify({"error": f"Invalid generation profile. Must be one of: {', '.join(PROFILES)}"}), 400
         logger.info(f"Parameters: num_mcqs={num_mcqs}, num_descriptive={num_descriptive}, mcq_marks={mcq_marks}, descriptive_marks={descriptive_marks}")
     except ValueError as e:
         logger.error(f"Invalid numeric parameters: {e}")
         return jsonify({"error": "Invalid numeric parameters"}), 400
 
     request_id = str(uuid4())
-    token_requests.insert_one({
-        "request_id": request_id,
-        "status": "pending",
-        "createdAt": datetime.now()
-    })
+    try:
+        queue_position = job_queue.enqueue(request_id, payload['id'], {
+            "inputType": input_type,
+            "subject": subject,
+            "textContent": text_content,
+            "pdfContent": pdf_content,
+            "numMCQs": num_mcqs,
+            "numDescriptive": num_descriptive,
+            "mcqMarks": mcq_marks,
+            "descriptiveMarks": descriptive_marks,
+            "forceRegenerate": force_regenerate,
+            "profile": profile
+        })
+    except QueueFull as e:
+        logger.warning(f"Rejected upload for teacher {payload['username']}: {e}")
+        return jsonify({"error": "Question generation queue is full, please try again later"}), 503
 
-    thread = threading.Thread(
-        target=process_content,
-        args=(request_id, input_type, subject, text_content, pdf_content, num_mcqs, num_descriptive, mcq_marks, descriptive_marks)
-    )
-    thread.start()
+    return jsonify({"request_id": request_id, "queuePosition": queue_position}), 202
 
-    return jsonify({"request_id": request_id}), 202
+@app.route('/api/token-requests/<request_id>/cancel', methods=['POST'])
+def cancel_token_request(request_id):
+    auth_token = request.headers.get('Authorization')
+    if not auth_token or not auth_token.startswith('Bearer '):
+        return jsonify({"error": "No token provided"}), 401
+    payload = authenticate(auth_token[7:])
+    if not payload or payload['role'] != 'teacher':
+        return jsonify({"error": "Unauthorized"}), 403
+    result = job_queue.cancel(request_id, payload['id'])
+    if not result:
+        return jsonify({"error": "No pending or running request found"}), 404
+    progress_broker.publish(request_id)
+    return jsonify({"status": result}), 200
 
 @app.route('/api/token-status/<request_id>', methods=['GET'])
 def token_status(request_id):
@@ -524,13 +534,20 @@ def token_status(request_id):
     if not payload or payload['role'] != 'teacher':
         return jsonify({"error": "Unauthorized"}), 403
 
-    request_data = token_requests.find_one({"request_id": request_id})
+    request_data = token_requests.find_one({"request_id": request_id, "teacherId": payload['id']})
     if not request_data:
         return jsonify({"error": "Request not found"}), 404
 
     status = request_data.get("status")
-    if status == "pending":
-        return jsonify({"status": "pending"}), 200
+    if status in ("pending", "running"):
+        return jsonify({
+            "status": "pending",
+            "stage": request_data.get("stage"),
+            "progress": request_data.get("progress"),
+            "queuePosition": job_queue.position(request_id)
+        }), 200
+    elif status == "cancelled":
+        return jsonify({"status": "cancelled"}), 200
     elif status == "completed":
         return jsonify({
             "status": "completed",
@@ -541,6 +558,101 @@ def token_status(request_id):
     elif status == "failed":
         return jsonify({"status": "failed", "error": request_data.get("error")}), 500
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.route('/api/token-events/<request_id>/ticket', methods=['POST'])
+def token_events_ticket(request_id):
+    auth_token = request.headers.get('Authorization')
+    if not auth_token or not auth_token.startswith('Bearer '):
+        return jsonify({"error": "No token provided"}), 401
+    payload = authenticate(auth_token[7:])
+    if not payload or payload['role'] != 'teacher':
+        return jsonify({"error": "Unauthorized"}), 403
+    if not token_requests.find_one({"request_id": request_id, "teacherId": payload['id']}, {"_id": 1}):
+        return jsonify({"error": "Request not found"}), 404
+    ticket = encode({
+        "id": payload['id'],
+        "role": EVENTS_TICKET_ROLE,
+        "aud": EVENTS_TICKET_AUDIENCE,
+        "request_id": request_id,
+        "exp": int(time.time() + EVENTS_TICKET_SECONDS)
+    }, JWT_SECRET, algorithm="HS256")
+    return jsonify({"ticket": ticket, "expiresIn": EVENTS_TICKET_SECONDS}), 200
+
+@app.route('/api/token-events/<request_id>', methods=['GET'])
+def token_events(request_id):
+    # Browsers open the stream with ?ticket= from /ticket; other clients may
+    # send the teacher's JWT as a header
+    auth_token = request.headers.get('Authorization')
+    if auth_token and auth_token.startswith('Bearer '):
+        payload = authenticate(auth_token[7:])
+        if not payload or payload['role'] != 'teacher':
+            return jsonify({"error": "Unauthorized"}), 403
+    elif request.args.get('ticket'):
+        payload = authenticate_ticket(request.args['ticket'], request_id)
+        if not payload:
+            return jsonify({"error": "Unauthorized"}), 403
+    else:
+        return jsonify({"error": "No token provided"}), 401
+    if not token_requests.find_one({"request_id": request_id, "teacherId": payload['id']}, {"_id": 1}):
+        return jsonify({"error": "Request not found"}), 404
+
+    def stream():
+        sent = {"mcqs": 0, "descriptiveQuestions": 0}
+        last_progress = None
+        last_sent = time.time()
+        version = progress_broker.version(request_id)
+        while True:
+            request_data = token_requests.find_one(
+                {"request_id": request_id},
+                {"status": 1, "stage": 1, "progress": 1, "token": 1, "error": 1, "leaseWorker": 1,
+                 "mcqs": {"$slice": [sent["mcqs"], 1000]},
+                 "descriptiveQuestions": {"$slice": [sent["descriptiveQuestions"], 1000]}}
+            )
+            if not request_data:
+                yield sse_event("failed", {"error": "Request not found"})
+                return
+            for field, kind in (("mcqs", "mcq"), ("descriptiveQuestions", "descriptive")):
+                for question_data in request_data.get(field) or []:
+                    sent[field] += 1
+                    last_sent = time.time()
+                    yield sse_event("question", {"type": kind, "question": question_data})
+            progress = {
+                "status": request_data.get("status"),
+                "stage": request_data.get("stage"),
+                "done": (request_data.get("progress") or {}).get("done", 0),
+                "requested": (request_data.get("progress") or {}).get("requested", 0)
+            }
+            if progress["status"] == "pending":
+                progress["queuePosition"] = job_queue.position(request_id)
+            if progress != last_progress:
+                last_progress = progress
+                last_sent = time.time()
+                yield sse_event("progress", progress)
+            if progress["status"] == "completed":
+                yield sse_event("completed", {"token": request_data.get("token")})
+                return
+            if progress["status"] == "failed":
+                yield sse_event("failed", {"error": request_data.get("error")})
+                return
+            if progress["status"] == "cancelled":
+                yield sse_event("cancelled", {})
+                return
+            # Jobs run inline by this process wake the stream through the broker;
+            # jobs run by worker processes (or by another API process behind
+            # gunicorn) are picked up by re-reading the document periodically.
+            running_here = GENERATION_MODE == 'inline' and request_data.get("leaseWorker") == job_queue.worker_id
+            timeout = SSE_KEEPALIVE_SECONDS if running_here else SSE_POLL_SECONDS
+            new_version = progress_broker.wait(request_id, version, timeout=timeout)
+            if new_version == version and time.time() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            version = new_version
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/api/teacher/questions/<token>', methods=['GET'])
 def get_questions(token):
     auth_token = request.headers.get('Authorization')
@@ -610,6 +722,7 @@ def get_question_history(token):
             "marks": question['marks']
         }
         student_performance = []
+        descriptive_answers = []
         for submission in submissions_list:
             answers = submission.get('answers', {})
             if question['type'] == 'mcq':
@@ -625,17 +738,18 @@ def get_question_history(token):
             elif question['type'] == 'descriptive':
                 for answer in answers.get('descriptive', []):
                     if str(answer['id']) == str(question['_id']):
-                        student_answer = nlp(answer['answer'].lower() if answer['answer'] else "")
-                        correct_answer = nlp(question['correctAnswer'].lower() if question['correctAnswer'] else "")
-                        similarity = student_answer.similarity(correct_answer) if student_answer and correct_answer else 0
-                        score = min(similarity * question['marks'], question['marks'])
-                        student_performance.append({
-                            "studentName": submission['studentName'],
-                            "answer": answer['answer'],
-                            "similarity": similarity,
-                            "score": round(score, 2),
-                            "submittedAt": submission['submittedAt'].isoformat()
-                        })
+                        descriptive_answers.append((submission, answer))
+        # All answers to a descriptive question are vectorized in one batch
+        similarities = grade_answers([(answer['answer'], question) for _, answer in descriptive_answers])
+        for (submission, answer), similarity in zip(descriptive_answers, similarities):
+            score = min(similarity * question['marks'], question['marks'])
+            student_performance.append({
+                "studentName": submission['studentName'],
+                "answer": answer['answer'],
+                "similarity": similarity,
+                "score": round(score, 2),
+                "submittedAt": submission['submittedAt'].isoformat()
+            })
         question_data['studentPerformance'] = student_performance
         history.append(question_data)
 
@@ -782,14 +896,16 @@ def submit_test():
             total_score += question['marks']
         if question:
             total_marks += question['marks']
+    graded = []
     for answer in descriptive_answers:
         question = next((q for q in descriptive_questions if str(q['_id']) == answer['id']), None)
         if question:
-            student_answer = nlp(answer['answer'].lower() if answer['answer'] else "")
-            correct_answer = nlp(question['correctAnswer'].lower() if question['correctAnswer'] else "")
-            similarity = student_answer.similarity(correct_answer) if student_answer and correct_answer else 0
-            total_score += min(similarity * question['marks'], question['marks'])
-            total_marks += question['marks']
+            graded.append((answer, question))
+    # One batch for every descriptive answer of the submission
+    similarities = grade_answers([(answer['answer'], question) for answer, question in graded])
+    for (answer, question), similarity in zip(graded, similarities):
+        total_score += min(similarity * question['marks'], question['marks'])
+        total_marks += question['marks']
 
     submission = {
         "token": token,
@@ -922,7 +1038,12 @@ def debug_password():
         return jsonify({"error": f"Password comparison failed: {e}"}), 500
     return jsonify({"generatedHash": hashed, "match": match}), 200
 
+# Development server. In production run gunicorn with gunicorn.conf.py, which
+# preloads this module and starts the inline workers after forking.
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     app.json_encoder = mongo_to_json
+    # With the debug reloader only the serving child process runs the workers
+    if GENERATION_MODE == 'inline' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_queue.start()
     app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
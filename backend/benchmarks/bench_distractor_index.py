@@ -0,0 +1,77 @@
+"""Compare sense2vec distractor lookups with the precomputed distractor index.
+
+Looks up the sense2vec neighbours of a fixed set of answer terms once per word
+through Sense2Vec (get_best_sense + most_similar, as sense2vec_get_words did)
+and once as a single batched query against ai.distractor_index, and reports
+the time per word and the overlap of the same-sense neighbours found.
+
+Usage (from backend/, after python prepare_resources.py):
+    python benchmarks/bench_distractor_index.py --top-n 40 --repeat 3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai import distractor_index, resources  # noqa: E402
+from ai import question_generator as qg  # noqa: E402
+
+WORDS = [
+    "photosynthesis", "chlorophyll", "mitochondria", "glucose", "oxygen", "carbon dioxide",
+    "Napoleon", "Bastille", "monarchy", "revolution", "France", "Germany", "India", "Japan",
+    "gravity", "acceleration", "velocity", "electron", "molecule", "protein", "democracy",
+    "parliament", "volcano", "earthquake", "river", "algorithm", "database", "computer",
+    "Shakespeare", "novel", "poetry", "economy", "inflation", "bacteria", "virus", "vaccine",
+]
+
+def lookup_per_word(s2v, top_n):
+    results = {}
+    for word in WORDS:
+        sense = s2v.get_best_sense(word, senses=qg.S2V_SENSES)
+        results[word] = qg.filter_same_sense_words(sense, s2v.most_similar(sense, n=top_n)) if sense else []
+    return results
+
+def lookup_batched(index, top_n):
+    neighbors = index.neighbors_for(WORDS, qg.S2V_SENSES, n=top_n)
+    return {word: qg.filter_same_sense_words(sense, similar) if sense else []
+            for word, (sense, similar) in neighbors.items()}
+
+def timed(fn, repeat):
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top-n", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    s2v = resources.load_sense2vec()
+    index = distractor_index.load_index()
+    if index is None:
+        start = time.perf_counter()
+        index = distractor_index.build_index(s2v)
+        print(f"Built distractor index with {len(index)} keys in {time.perf_counter() - start:.1f}s")
+
+    per_word_time, per_word = timed(lambda: lookup_per_word(s2v, args.top_n), args.repeat)
+    batched_time, batched = timed(lambda: lookup_batched(index, args.top_n), args.repeat)
+
+    overlaps = []
+    for word in WORDS:
+        a, b = set(per_word[word]), set(batched[word])
+        if a:
+            overlaps.append(len(a & b) / len(a))
+    print(f"{'lookup':<10} {'ms/word':>8} {'speedup':>8}")
+    print(f"{'sense2vec':<10} {per_word_time * 1000 / len(WORDS):>8.2f} {1.0:>8.2f}")
+    print(f"{'index':<10} {batched_time * 1000 / len(WORDS):>8.2f} {per_word_time / batched_time:>8.2f}")
+    if overlaps:
+        print(f"Same-sense neighbours found by sense2vec that the index also returns: "
+              f"{sum(overlaps) / len(overlaps):.0%} (the index returns top-n among same-sense keys)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Simulate an exam-end burst of submissions and compare grading latency.
+
+Grades the same burst of submissions twice from concurrent threads: once as
+submit_test did (the full spaCy pipeline on the student answer and on the
+reference answer of every descriptive question) and once with the cached
+reference vectors of grading.py and one batch per submission. Prints p50,
+p95 and p99 latency per submission and the largest score difference between
+the two.
+
+Reference vectors go to a scratch collection (dropped afterwards), so MongoDB
+must be running.
+
+Usage (from backend/, after python prepare_resources.py):
+    python benchmarks/bench_grading.py --submissions 200 --questions 10 --clients 16
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson.objectid import ObjectId  # noqa: E402
+from ai import nlp_service  # noqa: E402
+from corpus import CORPUS  # noqa: E402
+from db import db  # noqa: E402
+from grading import GradingVectors  # noqa: E402
+
+def make_questions(count):
+    sentences = [sentence for text in CORPUS for sentence in text.split(". ")]
+    return [{"_id": ObjectId(), "correctAnswer": " ".join(sentences[i % len(sentences):][:3])} for i in range(count)]
+
+def make_submissions(questions, count):
+    # Student answers: a sentence from the reference answer, varied per student
+    submissions = []
+    for i in range(count):
+        submission = []
+        for question in questions:
+            parts = question["correctAnswer"].split(". ")
+            submission.append((f"{parts[i % len(parts)]} {i}", question))
+        submissions.append(submission)
+    return submissions
+
+def grade_full(nlp, submission):
+    scores = []
+    for answer, question in submission:
+        student_answer = nlp(answer.lower() if answer else "")
+        correct_answer = nlp(question['correctAnswer'].lower() if question['correctAnswer'] else "")
+        scores.append(student_answer.similarity(correct_answer) if student_answer and correct_answer else 0)
+    return scores
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+def burst(grade, submissions, clients):
+    def timed(submission):
+        start = time.perf_counter()
+        scores = grade(submission)
+        return time.perf_counter() - start, scores
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(timed, submissions))
+    return time.perf_counter() - start, [latency for latency, _ in results], [scores for _, scores in results]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=10, help="descriptive questions per test")
+    parser.add_argument("--clients", type=int, default=16, help="submissions graded concurrently")
+    args = parser.parse_args()
+
+    nlp = nlp_service.get_nlp()
+    questions = make_questions(args.questions)
+    submissions = make_submissions(questions, args.submissions)
+    collection = db.bench_grading_vectors
+    grading_vectors = GradingVectors(collection)
+    try:
+        # As after process_content: the reference vectors are stored with the questions
+        grading_vectors.store([(question["_id"], question["correctAnswer"]) for question in questions])
+        grade_full(nlp, submissions[0])
+        full_total, full_latencies, full_scores = burst(lambda s: grade_full(nlp, s), submissions, args.clients)
+        cached_total, cached_latencies, cached_scores = burst(grading_vectors.grade, submissions, args.clients)
+    finally:
+        collection.drop()
+
+    difference = max(abs(a - b) for full, cached in zip(full_scores, cached_scores) for a, b in zip(full, cached))
+    print(f"{args.submissions} submissions x {args.questions} descriptive answers, {args.clients} concurrent\n")
+    print(f"{'grading':<16} {'total s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, total, latencies in (("full pipeline", full_total, full_latencies),
+                                   ("cached vectors", cached_total, cached_latencies)):
+        print(f"{name:<16} {total:>8.2f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f}")
+    print(f"\nLargest score difference: {difference:.6f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Check how long importing the API module takes and what it pulls in.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter, prints
+the slowest imports by cumulative time and fails (exit status 1) when the
+total exceeds the budget or when one of the heavy ML packages is imported.
+The API must stay free of them: generation runs in worker.py processes and
+spaCy is only loaded on first use.
+
+Usage (from backend/):
+    python benchmarks/bench_import_time.py --module app --budget 1.0 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Top-level packages that must not be imported by the API process
+FORBIDDEN = ["torch", "transformers", "sentence_transformers", "sense2vec", "spacy", "thinc",
+             "sklearn", "pke", "nltk", "pdfplumber", "gdown"]
+
+def import_times(module):
+    # Each line of the report: "import time: self [us] | cumulative | imported package"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit(f"Importing {module} failed")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget", type=float, default=1.0, help="maximum total import time in seconds")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    entries = import_times(args.module)
+    total = max((cumulative for name, _, cumulative in entries if name == args.module), default=0) / 1e6
+    print(f"{'cumulative_s':>12} {'self_s':>8}  module")
+    for name, self_us, cumulative_us in sorted(entries, key=lambda e: -e[2])[:args.top]:
+        print(f"{cumulative_us / 1e6:>12.3f} {self_us / 1e6:>8.3f}  {name}")
+
+    imported = {name for name, _, _ in entries}
+    forbidden = [name for name in FORBIDDEN if name in imported]
+    print(f"\nimport {args.module}: {total:.3f}s (budget {args.budget:.3f}s)")
+    failed = False
+    if forbidden:
+        print(f"FAIL: heavy packages imported: {', '.join(forbidden)}")
+        failed = True
+    if total > args.budget:
+        print("FAIL: import time over budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare the T5 inference backends against the fp32 PyTorch baseline.
+
+Runs the summary, question and answer generation paths of
+ai.question_generator on a fixed corpus and reports mean latency per call and
+output agreement (exact match rate and mean token Jaccard) with fp32.
+
+The onnx backend needs the ONNX exports (python prepare_resources.py --onnx).
+
+Usage (from backend/):
+    python benchmarks/bench_inference_backends.py --backends int8 onnx --repeat 3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai import model_store, inference_backends  # noqa: E402
+from ai import question_generator as qg  # noqa: E402
+from corpus import CORPUS, ANSWERS, QUESTIONS  # noqa: E402
+
+def run_tasks(models, repeat):
+    summary_model, summary_tokenizer = models["t5_summary"]
+    question_model, question_tokenizer = models["t5_question"]
+    answer_model, answer_tokenizer = models["t5_answer"]
+    tasks = {
+        "summary": lambda text, i: qg.summarizer(text, summary_model, summary_tokenizer),
+        "question": lambda text, i: qg.get_improved_question(text, ANSWERS[i], question_model, question_tokenizer),
+        "answer": lambda text, i: qg.generate_descriptive_answer(QUESTIONS[i], text, answer_model, answer_tokenizer),
+    }
+    results = {}
+    for task, fn in tasks.items():
+        outputs = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            outputs = []
+            for i, text in enumerate(CORPUS):
+                qg.set_seed(42)
+                outputs.append(fn(text, i))
+        elapsed = time.perf_counter() - start
+        results[task] = {"latency": elapsed / (repeat * len(CORPUS)), "outputs": outputs}
+    return results
+
+def token_jaccard(a, b):
+    a, b = set(a.lower().split()), set(b.lower().split())
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+def load_models(backend):
+    models = {}
+    for name in ("t5_summary", "t5_question", "t5_answer"):
+        model, tokenizer = model_store.load_t5(name)
+        models[name] = (inference_backends.prepare_model(name, model, backend=backend), tokenizer)
+    return models
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"], choices=inference_backends.BACKENDS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    baseline = run_tasks(load_models("torch"), args.repeat)
+    print(f"{'backend':<8} {'task':<9} {'latency_s':>10} {'speedup':>8} {'exact':>6} {'jaccard':>8}")
+    for task, result in baseline.items():
+        print(f"{'torch':<8} {task:<9} {result['latency']:>10.3f} {1.0:>8.2f} {1.0:>6.2f} {1.0:>8.2f}")
+    for backend in args.backends:
+        if backend == "torch":
+            continue
+        results = run_tasks(load_models(backend), args.repeat)
+        for task, result in results.items():
+            base = baseline[task]
+            pairs = list(zip(base["outputs"], result["outputs"]))
+            exact = sum(a == b for a, b in pairs) / len(pairs)
+            jaccard = sum(token_jaccard(a, b) for a, b in pairs) / len(pairs)
+            speedup = base["latency"] / result["latency"] if result["latency"] else 0
+            print(f"{backend:<8} {task:<9} {result['latency']:>10.3f} {speedup:>8.2f} {exact:>6.2f} {jaccard:>8.2f}")
+
+if __name__ == "__main__":
+    main()
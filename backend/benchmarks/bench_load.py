@@ -0,0 +1,125 @@
+"""Load-test the API under gunicorn with an increasing number of workers.
+
+For each worker count, starts `gunicorn -c gunicorn.conf.py` with
+WEB_WORKERS set accordingly on a free port, waits until it answers, sends
+requests to one endpoint from a fixed number of client threads for a fixed
+duration, stops the server, and prints a Markdown table (requests per
+second, p50/p95 latency and errors per worker count) with the speedup over
+the first worker count.
+
+The default endpoint is the question history of a test, which grades every
+descriptive answer of the test with spaCy. Log in as the teacher who owns the
+test (POST /api/login) and pass the returned token.
+
+Usage (from backend/, with MongoDB running and resources prepared):
+    python benchmarks/bench_load.py --path /api/teacher/question-history/<test token> \\
+        --bearer <teacher JWT> --workers 1 2 4 --clients 16 --duration 30
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def request(url, bearer):
+    req = urllib.request.Request(url, headers={"Authorization": f"Bearer {bearer}"} if bearer else {})
+    with urllib.request.urlopen(req, timeout=60) as response:
+        response.read()
+        return response.status
+
+def wait_until_ready(url, process, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("gunicorn exited during startup")
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except urllib.error.HTTPError:
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise SystemExit(f"gunicorn did not answer within {timeout}s")
+
+def run_load(url, bearer, clients, duration):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client():
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                ok = request(url, bearer) == 200
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+    return {
+        "rps": len(latencies) / duration,
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "errors": len(errors),
+    }
+
+def run_workers(workers, args):
+    port = free_port()
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_THREADS=str(args.threads), PORT=str(port), HOST="127.0.0.1")
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if not args.verbose else None)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base + args.path, process, args.startup_timeout)
+        # Warm-up, so that every worker has served a request before measuring
+        run_load(base + args.path, args.bearer, args.clients, min(5, args.duration))
+        return run_load(base + args.path, args.bearer, args.clients, args.duration)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", required=True, help="endpoint to load, e.g. /api/teacher/question-history/<token>")
+    parser.add_argument("--bearer", help="JWT sent as the Authorization header")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=4, help="WEB_THREADS per worker")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client threads")
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured per worker count")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--verbose", action="store_true", help="show gunicorn's log")
+    args = parser.parse_args()
+
+    print(f"`{args.path}`, {args.clients} clients, {args.threads} threads per worker, {os.cpu_count()} CPUs\n")
+    print("| Workers | Requests/s | p50 ms | p95 ms | Errors | Speedup |")
+    print("|---------|------------|--------|--------|--------|---------|")
+    baseline = None
+    for workers in args.workers:
+        result = run_workers(workers, args)
+        baseline = baseline or result["rps"]
+        speedup = result["rps"] / baseline if baseline else 0.0
+        print(f"| {workers} | {result['rps']:.1f} | {result['p50'] * 1000:.0f} | {result['p95'] * 1000:.0f} "
+              f"| {result['errors']} | {speedup:.2f} |", flush=True)
+
+if __name__ == "__main__":
+    main()
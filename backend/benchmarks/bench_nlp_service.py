@@ -0,0 +1,74 @@
+"""Compare the full spaCy pipeline with the task profiles of ai.nlp_service.
+
+Grades a fixed set of answer pairs with one full-pipeline call per answer (as
+the API did) and with one batched `vectors` call, and runs the sentence and
+entity tasks against the full pipeline, printing ms per document and checking
+that every task returns the same result as the full pipeline.
+
+Usage (from backend/, after python prepare_resources.py):
+    python benchmarks/bench_nlp_service.py --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai import nlp_service  # noqa: E402
+from corpus import CORPUS  # noqa: E402
+
+def answer_pairs():
+    # Each sentence of the corpus graded against the paragraph it comes from
+    pairs = []
+    for text in CORPUS:
+        for sentence in text.split(". "):
+            pairs.append((sentence.lower(), text.lower()))
+    return pairs
+
+def timed(fn, repeat):
+    result = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    nlp = nlp_service.get_nlp()
+    pairs = answer_pairs()
+    texts = [text for text, _ in pairs]
+
+    def full_similarities():
+        return [nlp(a).similarity(nlp(b)) if a and b else 0 for a, b in pairs]
+
+    def full_sentences():
+        return [len(list(nlp(text).sents)) for text in texts]
+
+    def full_entities():
+        return [[(ent.text, ent.label_) for ent in nlp(text).ents] for text in texts]
+
+    rows = [
+        ("similarity", len(pairs) * 2, full_similarities, lambda: nlp_service.similarities(pairs)),
+        ("sentences", len(texts), full_sentences, lambda: [nlp_service.count_sentences(t) for t in texts]),
+        ("entities", len(texts), full_entities, lambda: [nlp_service.entities(t) for t in texts]),
+    ]
+    print(f"{'task':<12} {'full ms/doc':>12} {'task ms/doc':>12} {'speedup':>8}  same result")
+    for name, docs, full_fn, task_fn in rows:
+        full_time, expected = timed(full_fn, args.repeat)
+        task_time, actual = timed(task_fn, args.repeat)
+        if name == "similarity":
+            same = all(abs(a - b) < 1e-5 for a, b in zip(expected, actual))
+        else:
+            same = expected == actual
+        print(f"{name:<12} {full_time * 1000 / docs:>12.3f} {task_time * 1000 / docs:>12.3f} "
+              f"{full_time / task_time:>8.2f}  {same}")
+    print("\nnlp_service.stats():")
+    for task, entry in nlp_service.stats().items():
+        print(f"  {task:<10} {entry['calls']:>6} calls {entry['docs']:>6} docs {entry['msPerCall']:>9.3f} ms/call")
+
+if __name__ == "__main__":
+    main()
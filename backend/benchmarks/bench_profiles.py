@@ -0,0 +1,69 @@
+"""Measure latency and output of each generation profile.
+
+Generates MCQs and descriptive questions for a fixed corpus with every
+profile in ai.profiles and prints a Markdown table (wall time per document,
+questions generated, mean question length and mean descriptive answer
+length), ready to be pasted into the README.
+
+Usage (from backend/):
+    python benchmarks/bench_profiles.py --mcqs 5 --descriptive 3 --profiles fast balanced thorough
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai import profiles  # noqa: E402
+from ai import question_generator as qg  # noqa: E402
+from corpus import CORPUS  # noqa: E402
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+def run_profile(name, num_mcqs, num_descriptive):
+    profiles.set_profile(name)
+    timings, mcq_counts, descriptive_counts, question_words, answer_words = [], [], [], [], []
+    for text in CORPUS:
+        qg.set_seed(42)
+        # A fresh analysis per run, so the summary is built with this profile
+        analysis = qg.DocumentAnalysis(text)
+        start = time.perf_counter()
+        mcqs = qg.generate_mcqs(text, num_mcqs, analysis=analysis)
+        descriptive = qg.generate_descriptive_questions(text, num_descriptive, analysis=analysis)
+        timings.append(time.perf_counter() - start)
+        mcq_counts.append(len(mcqs))
+        descriptive_counts.append(len(descriptive))
+        question_words += [len(q["question"].split()) for q in mcqs + descriptive]
+        answer_words += [len(q["answer"].split()) for q in descriptive]
+    return {
+        "seconds": mean(timings),
+        "mcqs": mean(mcq_counts),
+        "descriptive": mean(descriptive_counts),
+        "question_words": mean(question_words),
+        "answer_words": mean(answer_words),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=list(profiles.PROFILES), choices=list(profiles.PROFILES))
+    parser.add_argument("--mcqs", type=int, default=5)
+    parser.add_argument("--descriptive", type=int, default=3)
+    args = parser.parse_args()
+
+    qg.ensure_models_loaded()
+    # Warm-up, so that the first profile does not pay for lazy initialisation
+    profiles.set_profile("fast")
+    qg.generate_mcqs(CORPUS[0], 1, analysis=qg.DocumentAnalysis(CORPUS[0]))
+
+    print(f"| Profile | s / document | MCQs (of {args.mcqs}) | Descriptive (of {args.descriptive}) "
+          f"| Question words | Answer words |")
+    print("|---------|--------------|------|-------------|----------------|--------------|")
+    for name in args.profiles:
+        result = run_profile(name, args.mcqs, args.descriptive)
+        print(f"| `{name}` | {result['seconds']:.1f} | {result['mcqs']:.1f} | {result['descriptive']:.1f} "
+              f"| {result['question_words']:.1f} | {result['answer_words']:.1f} |")
+
+if __name__ == "__main__":
+    main()
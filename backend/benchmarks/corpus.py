@@ -0,0 +1,27 @@
+"""Fixed texts shared by the benchmarks.
+
+Kept free of imports, so benchmarks that only need spaCy or the API can use
+it without loading the generation stack. ANSWERS and QUESTIONS belong to the
+CORPUS text at the same position.
+"""
+
+CORPUS = [
+    "Photosynthesis is the process by which green plants use sunlight to synthesize food from carbon dioxide "
+    "and water. It takes place mainly in the chloroplasts of leaf cells, which contain the pigment chlorophyll. "
+    "The process releases oxygen as a by-product and stores energy in the form of glucose. Light-dependent "
+    "reactions occur in the thylakoid membranes, while the Calvin cycle takes place in the stroma.",
+    "The French Revolution began in 1789 and ended in the late 1790s with the ascent of Napoleon Bonaparte. "
+    "It was driven by widespread discontent with the monarchy and the poor economic policies of King Louis XVI. "
+    "The storming of the Bastille on 14 July 1789 became a symbol of the uprising. The revolution abolished "
+    "feudal privileges and proclaimed the Declaration of the Rights of Man and of the Citizen.",
+    "Newton's first law states that an object remains at rest or in uniform motion unless acted upon by a net "
+    "external force. The second law relates force, mass and acceleration through the equation F = ma. The third "
+    "law states that for every action there is an equal and opposite reaction. Together these laws form the "
+    "foundation of classical mechanics.",
+]
+ANSWERS = ["chlorophyll", "Bastille", "classical mechanics"]
+QUESTIONS = [
+    "Where does photosynthesis take place in a plant?",
+    "What caused the French Revolution?",
+    "What does Newton's second law describe?",
+]
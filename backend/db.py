@@ -0,0 +1,32 @@
+import logging
+import os
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Shared by the API (app.py) and the generation workers (worker.py)
+load_dotenv()
+
+# MongoDB Connection. connect=False defers connecting to the first operation,
+# so a client created before gunicorn forks its workers (preload_app) has no
+# sockets or monitor threads to carry across the fork.
+try:
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/qmaster'),
+                         maxPoolSize=10, serverSelectionTimeoutMS=5000, connect=False)
+    db = client['qmaster']
+    logger.info("MongoDB Connected")
+except ServerSelectionTimeoutError as e:
+    logger.error(f"MongoDB connection error: {e}")
+    exit(1)
+
+# Collections
+notes = db.notes
+submissions = db.submissions
+users = db.users
+questions = db.questions
+tests = db.tests
+token_requests = db.token_requests  # New collection for tracking token generation
+generation_cache = db.generation_cache  # Generated questions by content hash, reused across uploads
+grading_vectors = db.grading_vectors  # Reference-answer vectors of descriptive questions, by question id
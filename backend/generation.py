@@ -0,0 +1,285 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime
+from uuid import uuid4
+from ai import model_store, inference_backends, keyword_engines
+from ai.question_generator import generate_mcqs, generate_descriptive_questions, get_document_analysis, ensure_models_loaded, set_thread_budget, get_thread_budget, set_seed, track_embedding_stats, log_embedding_cache_stats
+from ai.profiles import PROFILES, resolve_profile, set_profile
+from db import notes, questions, token_requests, generation_cache as generation_cache_collection, grading_vectors as grading_vectors_collection
+from generation_cache import GenerationCache, cache_key, content_seed
+from grading import GradingVectors
+from job_queue import JobCancelled, LeaseLost
+
+logger = logging.getLogger(__name__)
+
+# Generation thread budget: the torch intra-op threads are split between the
+# MCQ and the descriptive generator, which run concurrently. The descriptive
+# one gets the larger share because it runs flan-t5-large.
+GENERATION_THREADS = int(os.getenv('GENERATION_THREADS', os.cpu_count() or 1))
+DESCRIPTIVE_THREAD_SHARE = float(os.getenv('DESCRIPTIVE_THREAD_SHARE', 0.67))
+
+generation_cache = GenerationCache(generation_cache_collection)
+grading_vectors = GradingVectors(grading_vectors_collection)
+
+def generation_params(profile):
+    # Everything besides the content that changes the generated questions
+    return {
+        "models": model_store.MODEL_SOURCES,
+        "backends": {name: inference_backends.backend_for(name) for name in ("t5_summary", "t5_question", "t5_answer")},
+        "profile": profile,
+        "profileSettings": PROFILES[profile],
+        "keywordEngine": keyword_engines.KEYWORD_ENGINE
+    }
+
+def question_document(kind, question_data, token_id, subject, marks, input_type, pdf_content):
+    if kind == "mcq":
+        return {
+            "token": token_id,
+            "type": "mcq",
+            "question": question_data['question'],
+            "options": question_data['options'],
+            "correctAnswer": question_data['correct'],
+            "correctIndex": question_data.get('correct_index', 0),
+            "marks": marks,
+            "context": question_data['context'],
+            "difficulty": question_data['difficulty'],
+            "subject": subject
+        }
+    return {
+        "token": token_id,
+        "type": "descriptive",
+        "question": question_data['question'],
+        "correctAnswer": question_data['answer'],
+        "marks": marks,
+        "pdfContent": pdf_content if input_type == 'pdf' else None,
+        "context": question_data['context'],
+        "difficulty": question_data['difficulty'],
+        "subject": subject
+    }
+
+class StageStopped(Exception):
+    # The other generation stage of the job failed, was cancelled or lost the lease
+    pass
+
+def discard_attempt(token_id):
+    # Questions are stored as they are generated, under a token that is only
+    # handed out when the job completes; an attempt that does not complete
+    # removes what it stored
+    question_ids = [str(doc['_id']) for doc in questions.find({"token": token_id}, {"_id": 1})]
+    if question_ids:
+        questions.delete_many({"token": token_id})
+        grading_vectors_collection.delete_many({"questionId": {"$in": question_ids}})
+    notes.delete_many({"token": token_id})
+    if question_ids:
+        logger.info(f"Removed {len(question_ids)} questions of unfinished token {token_id}")
+
+def set_stage(job, queue, stage, notify):
+    queue.update_owned(job, {"$set": {"stage": stage}})
+    notify(job['request_id'])
+
+# Background processing function, run by the generation job queue workers.
+# notify is called whenever the job document changed (used by the API's
+# in-process event streams when generation runs inline). Every write to the
+# job document goes through queue.update_owned, so it only applies while this
+# claim holds the job's lease; once another worker reclaimed the job, this
+# attempt stops without writing anything.
+def process_content(job, queue, notify=None):
+    notify = notify or (lambda request_id: None)
+    request_id = job['request_id']
+    params = job['params']
+    input_type = params['inputType']
+    subject = params['subject']
+    text_content = params['textContent']
+    pdf_content = params['pdfContent']
+    num_mcqs = params['numMCQs']
+    num_descriptive = params['numDescriptive']
+    mcq_marks = params['mcqMarks']
+    descriptive_marks = params['descriptiveMarks']
+    profile = resolve_profile(params.get('profile'))
+    token_id = str(uuid4())
+    try:
+        # An earlier attempt whose worker died may have left questions behind
+        if job.get('token'):
+            discard_attempt(job['token'])
+        mcqs = []
+        descriptive = []
+
+        content_to_process = pdf_content if input_type == 'pdf' else text_content
+        if not content_to_process.strip():
+            queue.update_owned(job, {"$set": {"status": "failed", "error": "No valid content to process for question generation"}})
+            return
+
+        queue.update_owned(
+            job,
+            {"$set": {"token": token_id, "stage": "models", "profile": profile, "mcqs": [], "descriptiveQuestions": [],
+                      "progress": {"done": 0, "requested": num_mcqs + num_descriptive}}}
+        )
+        notify(request_id)
+
+        # Every accepted question is stored and pushed to the request document as
+        # soon as it is generated, so clients can stream partial results. The
+        # generators also call check_cancelled before every batch or round, so a
+        # cancellation, a lost lease or a failure of the other stage stops both.
+        stopping = threading.Event()
+
+        def check_cancelled():
+            if stopping.is_set():
+                raise StageStopped(f"Other generation stage stopped for request_id {request_id}")
+            queue.check_lease(job)
+
+        reference_answers = []
+
+        def publisher(kind, marks, field):
+            def publish(question_data):
+                check_cancelled()
+                result = questions.insert_one(question_document(kind, question_data, token_id, subject, marks, input_type, pdf_content))
+                if kind == "descriptive":
+                    reference_answers.append((result.inserted_id, question_data['answer']))
+                queue.update_owned(job, {"$push": {field: question_data}, "$inc": {"progress.done": 1}})
+                notify(request_id)
+            return publish
+
+        stage_timings = {}
+        # Embedding cache lookups per stage, counted in the stage's own thread
+        embedding_stats = {}
+        started = time.time()
+
+        # Questions cached for the same content and parameters are served first;
+        # the models only run for the ones still missing, excluding the cached
+        # questions so that the top-up does not repeat them.
+        force_regenerate = params.get('forceRegenerate', False)
+        key = cache_key(content_to_process, generation_params(profile))
+        cached = None if force_regenerate else generation_cache.get(key)
+        cached_mcqs = cached["mcqs"] if cached else []
+        cached_descriptive = cached["descriptive"] if cached else []
+        mcqs = cached_mcqs[:num_mcqs]
+        descriptive = cached_descriptive[:num_descriptive]
+        publish_mcq = publisher("mcq", mcq_marks, "mcqs")
+        publish_descriptive = publisher("descriptive", descriptive_marks, "descriptiveQuestions")
+        for question_data in mcqs:
+            publish_mcq(question_data)
+        for question_data in descriptive:
+            publish_descriptive(question_data)
+        missing_mcqs = num_mcqs - len(mcqs)
+        missing_descriptive = num_descriptive - len(descriptive)
+        cache_info = {"key": key, "hit": cached is not None, "forced": force_regenerate,
+                      "reused": len(mcqs) + len(descriptive), "generated": 0}
+        stage_timings["cache"] = round(time.time() - started, 2)
+
+        if missing_mcqs > 0 or missing_descriptive > 0:
+            if force_regenerate:
+                seed = int.from_bytes(os.urandom(4), 'big')
+            else:
+                # A fresh run reproduces the cached questions; a top-up continues from them
+                seed = content_seed(key) + len(cached_mcqs) + len(cached_descriptive)
+
+            stage_started = time.time()
+            set_thread_budget(GENERATION_THREADS)
+            set_profile(profile)
+            ensure_models_loaded()
+            stage_timings["models"] = round(time.time() - stage_started, 2)
+
+            # Chunks, summary, keywords and entities are computed once, with the full
+            # thread budget, and shared by both generators
+            set_stage(job, queue, "analysis", notify)
+            stage_started = time.time()
+            with track_embedding_stats() as stats:
+                analysis = get_document_analysis(content_to_process).prepare()
+            embedding_stats["analysis"] = log_embedding_cache_stats(f"Analysis for request_id {request_id}", stats)
+            stage_timings["analysis"] = round(time.time() - stage_started, 2)
+            queue.update_owned(job, {"$set": {"keywordEngine": analysis.keyword_report}})
+            logger.info(f"Keyword extraction for request_id {request_id}: {analysis.keyword_report}")
+
+            descriptive_threads = max(1, round(GENERATION_THREADS * DESCRIPTIVE_THREAD_SHARE))
+            mcq_threads = max(1, GENERATION_THREADS - descriptive_threads)
+
+            def run_stage(name, generate, count, threads, on_question, exclude):
+                if count <= 0:
+                    return []
+                threads = set_thread_budget(threads)
+                set_seed(seed)
+                set_profile(profile)
+                stage_started = time.time()
+                logger.info(f"Generating {count} {name} questions for request_id {request_id} with {threads} threads")
+                try:
+                    with track_embedding_stats() as stats:
+                        result = generate(content_to_process, count, analysis=analysis, on_question=on_question,
+                                          exclude=exclude, check=check_cancelled)
+                except BaseException:
+                    stopping.set()
+                    raise
+                embedding_stats[name] = log_embedding_cache_stats(f"Stage {name} for request_id {request_id}", stats)
+                # The budget must still be in place after the first parallel regions
+                logger.info(f"Stage {name} for request_id {request_id} ran with {get_thread_budget()} threads")
+                stage_timings[name] = round(time.time() - stage_started, 2)
+                return result
+
+            check_cancelled()
+            set_stage(job, queue, "generating", notify)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                mcq_future = executor.submit(run_stage, "mcq", partial(generate_mcqs, subject=subject), missing_mcqs, mcq_threads,
+                                             publish_mcq, cached_mcqs)
+                descriptive_future = executor.submit(run_stage, "descriptive", generate_descriptive_questions, missing_descriptive,
+                                                     descriptive_threads, publish_descriptive, cached_descriptive)
+            # The stage that stopped first reports why; the other one only stopped because of it
+            errors = [future.exception() for future in (mcq_future, descriptive_future)]
+            errors = [e for e in errors if e is not None and not isinstance(e, StageStopped)]
+            if errors:
+                raise errors[0]
+            new_mcqs = mcq_future.result()
+            new_descriptive = descriptive_future.result()
+            mcqs += new_mcqs
+            descriptive += new_descriptive
+            cache_info["generated"] = len(new_mcqs) + len(new_descriptive)
+            if new_mcqs or new_descriptive:
+                generation_cache.store(key, cached_mcqs + new_mcqs, cached_descriptive + new_descriptive, seed)
+        else:
+            logger.info(f"Served request_id {request_id} entirely from the generation cache")
+        stage_timings["total"] = round(time.time() - started, 2)
+        logger.info(f"Stage timings for request_id {request_id}: {stage_timings}")
+
+        if not mcqs and not descriptive:
+            queue.update_owned(
+                job,
+                {"$set": {"status": "failed", "error": "Failed to generate any questions", "stageTimings": stage_timings, "embeddingCache": embedding_stats, "cache": cache_info}}
+            )
+            return
+
+        logger.info(f"Inserted {len(mcqs) + len(descriptive)} questions for token {token_id}")
+        # Reference answers are vectorized once here rather than on every grading;
+        # the API computes any that are missing on first use
+        try:
+            grading_vectors.store(reference_answers)
+        except Exception as e:
+            logger.warning(f"Could not precompute grading vectors for token {token_id}: {e}")
+        content_to_store = content_to_process
+        notes.insert_one({"token": token_id, "content": content_to_store, "createdAt": datetime.now(), "inputType": input_type, "subject": subject})
+        logger.info(f"Inserted note with token: {token_id}")
+
+        queue.update_owned(
+            job,
+            {"$set": {"status": "completed", "stage": "completed", "token": token_id, "mcqs": mcqs, "descriptiveQuestions": descriptive, "stageTimings": stage_timings, "embeddingCache": embedding_stats, "cache": cache_info}}
+        )
+    except LeaseLost as e:
+        logger.warning(f"{e}; abandoning this attempt")
+        discard_attempt(token_id)
+    except JobCancelled as e:
+        logger.info(str(e))
+        discard_attempt(token_id)
+        token_requests.update_one(
+            queue.owned_filter(job),
+            {"$set": {"status": "cancelled", "stage": "cancelled", "finishedAt": datetime.now()}}
+        )
+    except Exception as e:
+        logger.error(f"Background processing failed for request_id {request_id}: {e}", exc_info=True)
+        discard_attempt(token_id)
+        token_requests.update_one(
+            queue.owned_filter(job),
+            {"$set": {"status": "failed", "error": str(e)}}
+        )
+    finally:
+        notify(request_id)
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+# Generated questions are cached per (normalized content, generation
+# parameters), so a re-upload of the same notes is served from the cache, or
+# topped up with only the questions still missing, instead of re-running T5.
+# Entries unused for GENERATION_CACHE_TTL_DAYS are removed by a Mongo TTL
+# index; beyond GENERATION_CACHE_MAX_ENTRIES the least recently used go first.
+GENERATION_CACHE_TTL_DAYS = float(os.getenv('GENERATION_CACHE_TTL_DAYS', 30))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', 500))
+# Bump whenever a change to the generators makes previously cached questions stale
+GENERATION_CACHE_VERSION = 1
+
+def normalize_content(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+def cache_key(content, params):
+    payload = json.dumps({"content": normalize_content(content), "params": params,
+                          "version": GENERATION_CACHE_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def content_seed(key):
+    # Fresh runs for the same key are seeded identically, so they reproduce the cached questions
+    return int(key[:8], 16)
+
+class GenerationCache:
+    def __init__(self, collection, ttl_days=GENERATION_CACHE_TTL_DAYS, max_entries=GENERATION_CACHE_MAX_ENTRIES):
+        self.collection = collection
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+        self.indexes_ready = False
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index("key", unique=True)
+        self.collection.create_index("lastUsedAt", expireAfterSeconds=int(self.ttl_days * 86400))
+        self.indexes_ready = True
+
+    def get(self, key):
+        self.ensure_indexes()
+        return self.collection.find_one_and_update(
+            {"key": key},
+            {"$set": {"lastUsedAt": datetime.now()}, "$inc": {"hits": 1}}
+        )
+
+    def store(self, key, mcqs, descriptive, seed):
+        self.ensure_indexes()
+        now = datetime.now()
+        self.collection.update_one(
+            {"key": key},
+            {"$set": {"mcqs": mcqs, "descriptive": descriptive, "seed": seed, "lastUsedAt": now},
+             "$setOnInsert": {"createdAt": now, "hits": 0}},
+            upsert=True
+        )
+        self.evict()
+
+    def evict(self):
+        excess = self.collection.count_documents({}) - self.max_entries
+        if excess <= 0:
+            return
+        stale = [entry["_id"] for entry in self.collection.find({}, {"_id": 1})
+                 .sort("lastUsedAt", ASCENDING).limit(excess)]
+        self.collection.delete_many({"_id": {"$in": stale}})
+        logger.info(f"Evicted {len(stale)} generation cache entries")
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from pymongo import ASCENDING
+from ai import nlp_service
+
+logger = logging.getLogger(__name__)
+
+# Descriptive answers are graded by the spaCy similarity of the lowercased
+# student answer and reference answer. The reference side only depends on the
+# question, so its vector is computed once (by the generation worker when the
+# question is inserted, or on the first grading otherwise), stored in the
+# grading_vectors collection and kept in an in-memory LRU by question id.
+# Each entry records a hash of the reference text it was computed from, so an
+# edited answer or a different spaCy model is never graded with a stale vector.
+GRADING_VECTOR_CACHE_SIZE = int(os.getenv('GRADING_VECTOR_CACHE_SIZE', 5000))
+
+def normalize_answer(text):
+    return (text or "").lower()
+
+def answer_hash(text):
+    return hashlib.sha256(normalize_answer(text).encode('utf-8')).hexdigest()
+
+def vector_entry(doc):
+    # What Doc.similarity needs from a Doc: its vector and norm, and the token
+    # texts for its shortcut between identical documents
+    vector = np.asarray(doc.vector, dtype=np.float32)
+    return {"vector": vector, "norm": float(np.linalg.norm(vector)), "tokens": [token.orth_ for token in doc]}
+
+def similarities(docs, references):
+    # Vectorized Doc.similarity of each student Doc and reference entry: 1.0
+    # for identical token sequences, 0 when either side is empty or has a
+    # zero vector, the cosine of the two vectors otherwise. An empty Doc's
+    # vector has no dimensions at all (the model has no static vectors), so
+    # those pairs are scored up front and only the others are stacked.
+    results = [0] * len(docs)
+    scored = []
+    for i, (doc, reference) in enumerate(zip(docs, references)):
+        if not len(doc) or not reference["tokens"]:
+            continue
+        if [token.orth_ for token in doc] == reference["tokens"]:
+            results[i] = 1.0
+            continue
+        vector = np.asarray(doc.vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0 or reference["norm"] == 0 or vector.shape != reference["vector"].shape:
+            continue
+        scored.append((i, vector, norm, reference))
+    if scored:
+        vectors = np.stack([vector for _, vector, _, _ in scored])
+        reference_vectors = np.stack([reference["vector"] for _, _, _, reference in scored])
+        norms = np.array([norm * reference["norm"] for _, _, norm, reference in scored], dtype=np.float32)
+        cosines = np.einsum("ij,ij->i", vectors, reference_vectors) / norms
+        for (i, _, _, _), cosine in zip(scored, cosines):
+            results[i] = float(cosine)
+    return results
+
+class GradingVectors:
+    def __init__(self, collection, cache_size=GRADING_VECTOR_CACHE_SIZE):
+        self.collection = collection
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.indexes_ready = False
+        self.model = None
+
+    def ensure_indexes(self):
+        if self.indexes_ready:
+            return
+        self.collection.create_index([("questionId", ASCENDING)], unique=True)
+        self.indexes_ready = True
+
+    def model_version(self):
+        # Vectors from another spaCy model are not comparable
+        if self.model is None:
+            meta = nlp_service.get_nlp().meta
+            self.model = f"{meta.get('name')}-{meta.get('version')}"
+        return self.model
+
+    def remember(self, question_id, entry):
+        with self.lock:
+            self.cache[question_id] = entry
+            self.cache.move_to_end(question_id)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def cached(self, question_id, digest):
+        with self.lock:
+            entry = self.cache.get(question_id)
+            if entry is None or entry["answerHash"] != digest:
+                return None
+            self.cache.move_to_end(question_id)
+            return entry
+
+    def store(self, question_answers):
+        # question_answers: (question id, reference answer) pairs; all
+        # references are vectorized in one batch
+        if not question_answers:
+            return {}
+        self.ensure_indexes()
+        model = self.model_version()
+        docs = nlp_service.pipe([normalize_answer(answer) for _, answer in question_answers], "vectors")
+        entries = {}
+        now = datetime.now()
+        for (question_id, answer), doc in zip(question_answers, docs):
+            entry = dict(vector_entry(doc), answerHash=answer_hash(answer), model=model)
+            self.collection.update_one(
+                {"questionId": str(question_id)},
+                {"$set": {"vector": entry["vector"].tolist(), "norm": entry["norm"], "tokens": entry["tokens"],
+                          "answerHash": entry["answerHash"], "model": model, "updatedAt": now}},
+                upsert=True
+            )
+            self.remember(str(question_id), entry)
+            entries[str(question_id)] = entry
+        return entries
+
+    def get_many(self, questions):
+        # Reference entries for question documents, by question id: from memory,
+        # then from the collection, computing (and storing) the ones missing
+        entries = {}
+        wanted = {}
+        for question in questions:
+            question_id = str(question['_id'])
+            digest = answer_hash(question.get('correctAnswer'))
+            entry = self.cached(question_id, digest)
+            if entry is not None:
+                entries[question_id] = entry
+            else:
+                wanted[question_id] = (question.get('correctAnswer'), digest)
+        if wanted:
+            self.ensure_indexes()
+            model = self.model_version()
+            for stored in self.collection.find({"questionId": {"$in": list(wanted)}}):
+                question_id = stored["questionId"]
+                if stored.get("answerHash") != wanted[question_id][1] or stored.get("model") != model:
+                    continue
+                entry = {"vector": np.asarray(stored["vector"], dtype=np.float32), "norm": stored["norm"],
+                         "tokens": stored["tokens"], "answerHash": stored["answerHash"], "model": model}
+                self.remember(question_id, entry)
+                entries[question_id] = entry
+            missing = [(question_id, answer) for question_id, (answer, _) in wanted.items() if question_id not in entries]
+            if missing:
+                entries.update(self.store(missing))
+        return entries
+
+    def grade(self, graded):
+        # graded: (student answer, question document) pairs. Returns the
+        # similarity of each, with all student answers vectorized in one batch.
+        if not graded:
+            return []
+        references = self.get_many({str(question['_id']): question for _, question in graded}.values())
+        docs = nlp_service.pipe([normalize_answer(answer) for answer, _ in graded], "vectors")
+        return similarities(docs, [references[str(question['_id'])] for _, question in graded])
@@ -0,0 +1,51 @@
+import gc
+import os
+
+# Production entry point for the API: gunicorn -c gunicorn.conf.py
+#
+# The app module is imported once in the master (preload_app) together with
+# the read-only state every request may need, and the workers are forked from
+# it, so they share those pages copy-on-write instead of each loading its own
+# copy. The garbage collector is kept off while preloading and the preloaded
+# objects are frozen before forking: collections in the workers then never
+# write to the shared objects' GC headers, which would otherwise copy the
+# pages. Generation workers (GENERATION_MODE=inline) are threads, so they are
+# only started after the fork, in each worker.
+wsgi_app = "app:app"
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_WORKERS', 2))
+# Threads per worker; an open /api/token-events stream holds one
+threads = int(os.getenv('WEB_THREADS', 8))
+worker_class = "gthread"
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+preload_app = True
+accesslog = "-"
+
+# What the master loads before forking
+PRELOAD_SPACY = os.getenv('PRELOAD_SPACY', 'true').lower() == 'true'
+# Loads the generation models as well (inline mode only). Torch must not run
+# inference before the fork, so they are loaded but not warmed up.
+PRELOAD_GENERATOR_MODELS = os.getenv('PRELOAD_GENERATOR_MODELS', 'false').lower() == 'true'
+
+def on_starting(server):
+    gc.disable()
+    import app
+    if PRELOAD_SPACY:
+        from ai import nlp_service
+        nlp_service.get_nlp()
+        # One call, so the pipeline's lazily created buffers exist before forking
+        nlp_service.similarities([("warm up", "warm up")])
+        nlp_service.reset_stats()
+        server.log.info("Preloaded the spaCy pipeline")
+    if PRELOAD_GENERATOR_MODELS and app.GENERATION_MODE == 'inline':
+        from ai import question_generator
+        question_generator.ensure_models_loaded()
+        server.log.info("Preloaded the generation models")
+    gc.collect()
+    gc.freeze()
+
+def post_fork(server, worker):
+    gc.enable()
+    import app
+    if app.GENERATION_MODE == 'inline':
+        app.job_queue.start()
@@ -0,0 +1,213 @@
+import logging
+import os
+import socket
+import threading
+from collections import Counter
+from datetime import datetime
+from uuid import uuid4
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Generation jobs live in the token_requests collection:
+#   pending -> running -> completed | failed | cancelled
+# Workers (threads of worker.py processes, on any number of nodes, or of the
+# API process in inline mode) claim jobs atomically with a lease that they
+# renew with heartbeats. A job whose lease expires because its worker died is
+# claimed again by another worker. Every claim gets its own lease id, stored as
+# leaseOwner, and every write a worker makes to a running job is conditional
+# on it, so a worker that lost its lease can no longer touch the job. Lease
+# times come from the database clock ($$NOW), so workers on nodes with other
+# clocks or time zones agree on when a lease expires.
+GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', 1))
+MAX_QUEUE_DEPTH = int(os.getenv('MAX_QUEUE_DEPTH', 20))
+QUEUE_POLL_SECONDS = float(os.getenv('QUEUE_POLL_SECONDS', 5))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 60))
+MAX_JOB_ATTEMPTS = int(os.getenv('MAX_JOB_ATTEMPTS', 3))
+FAIRNESS_WINDOW = 200
+
+class QueueFull(Exception):
+    pass
+
+class JobCancelled(Exception):
+    pass
+
+class LeaseLost(Exception):
+    # The job was reclaimed by another worker; this attempt must stop without writing
+    pass
+
+class JobQueue:
+    def __init__(self, collection, handler=None, workers=GENERATION_WORKERS, max_depth=MAX_QUEUE_DEPTH,
+                 poll_interval=QUEUE_POLL_SECONDS, lease_seconds=JOB_LEASE_SECONDS):
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.lost_leases = set()
+        self.threads = []
+
+    def ensure_indexes(self):
+        self.collection.create_index([("status", ASCENDING), ("createdAt", ASCENDING)])
+        self.collection.create_index([("status", ASCENDING), ("leaseExpiresAt", ASCENDING)])
+        self.collection.create_index("request_id")
+
+    def claimable_filter(self):
+        return {"$or": [
+            {"status": "pending"},
+            {"status": "running", "$expr": {"$lt": ["$leaseExpiresAt", "$$NOW"]}},
+            {"status": "running", "leaseExpiresAt": {"$exists": False}}
+        ]}
+
+    def lease_expiry(self):
+        return {"$add": ["$$NOW", int(self.lease_seconds * 1000)]}
+
+    def owned_filter(self, job):
+        # Matches the job only while this claim still holds its lease
+        return {"_id": job["_id"], "leaseOwner": job["leaseOwner"]}
+
+    def enqueue(self, request_id, teacher_id, params):
+        if self.collection.count_documents({"status": "pending"}) >= self.max_depth:
+            raise QueueFull(f"Generation queue is full ({self.max_depth} pending jobs)")
+        self.collection.insert_one({
+            "request_id": request_id,
+            "teacherId": teacher_id,
+            "status": "pending",
+            "params": params,
+            "createdAt": datetime.now()
+        })
+        self.wake.set()
+        return self.position(request_id)
+
+    def position(self, request_id):
+        job = self.collection.find_one({"request_id": request_id}, {"status": 1, "createdAt": 1})
+        if not job or job.get("status") != "pending":
+            return 0
+        return self.collection.count_documents({"status": "pending", "createdAt": {"$lt": job["createdAt"]}}) + 1
+
+    def next_candidate(self):
+        # Per-teacher fairness: the oldest claimable job of the teacher with the
+        # fewest running jobs goes first, so one teacher's burst of uploads
+        # cannot starve everybody else.
+        running = Counter(job.get("teacherId") for job in self.collection.find(
+            {"status": "running", "$expr": {"$gte": ["$leaseExpiresAt", "$$NOW"]}}, {"teacherId": 1}))
+        claimable = list(self.collection.find(self.claimable_filter(), {"teacherId": 1, "createdAt": 1})
+                         .sort("createdAt", ASCENDING).limit(FAIRNESS_WINDOW))
+        if not claimable:
+            return None
+        return min(claimable, key=lambda job: (running[job.get("teacherId")], job["createdAt"]))
+
+    def claim(self):
+        while True:
+            candidate = self.next_candidate()
+            if candidate is None:
+                return None
+            job = self.collection.find_one_and_update(
+                {"_id": candidate["_id"], **self.claimable_filter()},
+                [{"$set": {"status": "running", "startedAt": "$$NOW", "leaseOwner": uuid4().hex,
+                           "leaseWorker": self.worker_id, "leaseExpiresAt": self.lease_expiry(),
+                           "attempts": {"$add": [{"$ifNull": ["$attempts", 0]}, 1]}}}],
+                return_document=ReturnDocument.AFTER
+            )
+            if not job:
+                continue
+            if job["attempts"] > MAX_JOB_ATTEMPTS:
+                # The job took down its worker too many times
+                self.collection.update_one(
+                    self.owned_filter(job),
+                    [{"$set": {"status": "failed", "error": "Generation failed repeatedly", "finishedAt": "$$NOW"}}]
+                )
+                continue
+            return job
+
+    def heartbeat(self, job, done):
+        while not done.wait(self.lease_seconds / 3):
+            result = self.collection.update_one(
+                {**self.owned_filter(job), "status": "running"},
+                [{"$set": {"leaseExpiresAt": self.lease_expiry()}}]
+            )
+            if result.matched_count == 0:
+                # Another worker took over (or the job finished); stop at the next checkpoint
+                self.lost_leases.add(job["leaseOwner"])
+                return
+
+    def cancel(self, request_id, teacher_id):
+        result = self.collection.update_one(
+            {"request_id": request_id, "teacherId": teacher_id, "status": "pending"},
+            {"$set": {"status": "cancelled", "finishedAt": datetime.now()}}
+        )
+        if result.modified_count:
+            return "cancelled"
+        result = self.collection.update_one(
+            {"request_id": request_id, "teacherId": teacher_id, "status": "running"},
+            {"$set": {"cancelRequested": True}}
+        )
+        return "cancelling" if result.modified_count else None
+
+    def check_lease(self, job):
+        # Raises LeaseLost once the job belongs to another claim, JobCancelled
+        # once its teacher cancelled it
+        if job["leaseOwner"] in self.lost_leases:
+            raise LeaseLost(f"Lost the lease on generation job {job['request_id']}")
+        current = self.collection.find_one({"_id": job["_id"]}, {"cancelRequested": 1, "status": 1, "leaseOwner": 1})
+        if not current or current.get("leaseOwner") != job["leaseOwner"]:
+            raise LeaseLost(f"Lost the lease on generation job {job['request_id']}")
+        if current.get("cancelRequested", False) or current.get("status") == "cancelled":
+            raise JobCancelled(f"Generation cancelled for request_id {job['request_id']}")
+
+    def update_owned(self, job, update):
+        # Job document write that only applies while this claim holds the lease
+        result = self.collection.update_one(self.owned_filter(job), update)
+        if result.matched_count == 0:
+            raise LeaseLost(f"Lost the lease on generation job {job['request_id']}")
+        return result
+
+    def start(self):
+        # Leases are owned by the process running the workers, which can be a
+        # fork of the one that created the queue (gunicorn preload_app)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.ensure_indexes()
+        pending = self.collection.count_documents(self.claimable_filter())
+        if pending:
+            logger.info(f"{pending} generation jobs waiting to be claimed")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.run_worker, name=f"generation-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Started {self.workers} generation workers as {self.worker_id}")
+
+    def stop(self):
+        # Running jobs finish; nothing new is claimed
+        self.stopping.set()
+        self.wake.set()
+
+    def join(self):
+        for thread in self.threads:
+            while thread.is_alive():
+                thread.join(1)
+
+    def run_worker(self):
+        while not self.stopping.is_set():
+            try:
+                job = self.claim()
+            except Exception as e:
+                logger.error(f"Failed to claim generation job: {e}")
+                job = None
+            if job is None:
+                self.wake.wait(self.poll_interval)
+                self.wake.clear()
+                continue
+            done = threading.Event()
+            heartbeat = threading.Thread(target=self.heartbeat, args=(job, done), daemon=True)
+            heartbeat.start()
+            try:
+                self.handler(job, self)
+            except Exception as e:
+                logger.error(f"Generation job {job['request_id']} crashed: {e}", exc_info=True)
+            finally:
+                done.set()
+                self.lost_leases.discard(job['leaseOwner'])
@@ -0,0 +1,36 @@
+import argparse
+import json
+
+from ai import resources
+
+# One-shot installation of everything question generation needs at runtime:
+# NLTK data, the spaCy model and the sense2vec vectors into RESOURCE_DIR, and
+# the T5 / sentence-transformer weights and the sense2vec distractor index into
+# the model store. Run it once per node (or once on a machine with network
+# access, then copy both directories); the API and the workers never download.
+def main():
+    parser = argparse.ArgumentParser(description="Install and verify QMaster generation resources")
+    parser.add_argument("--verify", action="store_true",
+                        help="only check the installed resources, re-hashing the model store files")
+    parser.add_argument("--onnx", action="store_true",
+                        help="export every T5 model to ONNX, not only those whose INFERENCE_BACKEND is onnx")
+    args = parser.parse_args()
+
+    if not args.verify:
+        resources.prepare_resources(onnx=args.onnx)
+    try:
+        manifest = resources.check_resources()
+    except resources.MissingResources as e:
+        print(e)
+        raise SystemExit(1)
+    if args.verify:
+        from ai import model_store
+        corrupted = [name for name in resources.model_entries() if not model_store.verify_entry(name, deep=True)]
+        if corrupted:
+            print(f"Model store entries failing the checksum check: {', '.join(corrupted)}")
+            raise SystemExit(1)
+    print(json.dumps(manifest, indent=2, sort_keys=True))
+    print(f"All generation resources are installed in {resources.RESOURCE_DIR} and the model store")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import logging
+import signal
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(processName)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+from db import token_requests  # noqa: E402
+from job_queue import JobQueue, GENERATION_WORKERS  # noqa: E402
+from generation import process_content  # noqa: E402
+from ai import resources  # noqa: E402
+
+# Standalone generation worker. Run one or more of these next to the API
+# (python worker.py), on the same node or on other nodes sharing the MongoDB;
+# they claim jobs from token_requests with leases, so any number can run.
+def main():
+    parser = argparse.ArgumentParser(description="QMaster question generation worker")
+    parser.add_argument("--workers", type=int, default=GENERATION_WORKERS,
+                        help="generation jobs processed concurrently by this process")
+    args = parser.parse_args()
+
+    try:
+        resources.check_resources()
+    except resources.MissingResources as e:
+        logger.error(str(e))
+        raise SystemExit(1)
+
+    queue = JobQueue(token_requests, process_content, workers=args.workers)
+
+    def shutdown(signum, frame):
+        logger.info("Shutting down after the running jobs finish")
+        queue.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    queue.start()
+    queue.join()
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,8 @@ function Teacher({ token, role, updateLatestToken }) {
       numDescriptive: 3,
       mcqMarks: 2,
       descriptiveMarks: 10,
+      forceRegenerate: false,
+      profile: 'balanced',
       tokenId: '',
       message: '',
       showTokenModal: false,
@@ -48,6 +50,8 @@ function Teacher({ token, role, updateLatestToken }) {
     numDescriptive,
     mcqMarks,
     descriptiveMarks,
+    forceRegenerate,
+    profile,
     tokenId,
     message,
     showTokenModal,
@@ -73,6 +77,8 @@ function Teacher({ token, role, updateLatestToken }) {
       numDescriptive: 3,
       mcqMarks: 2,
       descriptiveMarks: 10,
+      forceRegenerate: false,
+      profile: 'balanced',
       tokenId: '',
       message: '',
       showTokenModal: false,
@@ -92,47 +98,102 @@ function Teacher({ token, role, updateLatestToken }) {
   }, [role, navigate]);
 
   useEffect(() => {
-    let pollingInterval;
-    if (requestId && isPolling) {
-      pollingInterval = setInterval(async () => {
-        try {
-          const res = await axios.get(`http://localhost:5000/api/token-status/${requestId}`, {
-            headers: { Authorization: `Bearer ${token}` },
-          });
-          const { status, token: newToken, error } = res.data;
-          if (status === 'completed') {
-            setState(prev => ({
-              ...prev,
-              tokenId: newToken,
-              generatedToken: newToken,
-              showTokenModal: true,
-              message: 'Content uploaded successfully',
-              isPolling: false,
-              requestId: '',
-            }));
-            updateLatestToken(newToken);
-            clearInterval(pollingInterval);
-          } else if (status === 'failed') {
-            setState(prev => ({
-              ...prev,
-              message: error || 'Upload failed',
-              isPolling: false,
-              requestId: '',
-            }));
-            clearInterval(pollingInterval);
-          }
-        } catch (error) {
+    if (!requestId || !isPolling) return undefined;
+    // Progress and generated questions are streamed over Server-Sent Events.
+    // The stream is opened with a short-lived ticket for this request rather
+    // than the login token, which would end up in server and proxy logs.
+    let source = null;
+    let closed = false;
+    let reconnects = 0;
+
+    const connect = async () => {
+      let ticket;
+      try {
+        const res = await axios.post(`http://localhost:5000/api/token-events/${requestId}/ticket`, null, {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        ticket = res.data.ticket;
+      } catch (error) {
+        if (!closed) {
           setState(prev => ({
             ...prev,
             message: error.response?.data?.error || 'Failed to check token status',
             isPolling: false,
             requestId: '',
           }));
-          clearInterval(pollingInterval);
         }
-      }, 2000); // Poll every 2 seconds
-    }
-    return () => clearInterval(pollingInterval);
+        return;
+      }
+      if (closed) return;
+      source = new EventSource(
+        `http://localhost:5000/api/token-events/${requestId}?ticket=${encodeURIComponent(ticket)}`
+      );
+      source.addEventListener('progress', (event) => {
+        const { status, done, requested, queuePosition } = JSON.parse(event.data);
+        setState(prev => ({
+          ...prev,
+          message: status === 'pending'
+            ? `Waiting in the generation queue (position ${queuePosition})...`
+            : `Processing content, please wait... (${done}/${requested} questions generated)`,
+        }));
+      });
+      source.addEventListener('completed', (event) => {
+        const { token: newToken } = JSON.parse(event.data);
+        setState(prev => ({
+          ...prev,
+          tokenId: newToken,
+          generatedToken: newToken,
+          showTokenModal: true,
+          message: 'Content uploaded successfully',
+          isPolling: false,
+          requestId: '',
+        }));
+        updateLatestToken(newToken);
+        source.close();
+      });
+      source.addEventListener('failed', (event) => {
+        const { error } = JSON.parse(event.data);
+        setState(prev => ({
+          ...prev,
+          message: error || 'Upload failed',
+          isPolling: false,
+          requestId: '',
+        }));
+        source.close();
+      });
+      source.addEventListener('cancelled', () => {
+        setState(prev => ({
+          ...prev,
+          message: 'Question generation was cancelled',
+          isPolling: false,
+          requestId: '',
+        }));
+        source.close();
+      });
+      source.onerror = () => {
+        // EventSource reconnects on its own unless the server refused the
+        // stream, e.g. because its ticket expired; then a new ticket is fetched
+        if (source.readyState === EventSource.CLOSED && !closed) {
+          if (reconnects < 3) {
+            reconnects += 1;
+            connect();
+            return;
+          }
+          setState(prev => ({
+            ...prev,
+            message: 'Failed to check token status',
+            isPolling: false,
+            requestId: '',
+          }));
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      if (source) source.close();
+    };
   }, [requestId, isPolling, token, updateLatestToken]);
 
   const updateState = (newState) => {
@@ -167,6 +228,8 @@ function Teacher({ token, role, updateLatestToken }) {
     formData.append('numDescriptive', numDescriptive);
     formData.append('mcqMarks', mcqMarks);
     formData.append('descriptiveMarks', descriptiveMarks);
+    formData.append('forceRegenerate', forceRegenerate);
+    formData.append('profile', profile);
 
     try {
       const res = await axios.post('http://localhost:5000/api/upload-content', formData, {
@@ -355,6 +418,33 @@ function Teacher({ token, role, updateLatestToken }) {
                 step="0.5"
               />
             </div>
+            <div>
+              <label htmlFor="profile" className="block text-sm font-medium text-gray-700">
+                Generation Profile
+              </label>
+              <select
+                id="profile"
+                value={profile}
+                onChange={(e) => updateState({ profile: e.target.value })}
+                className="mt-1 block w-full p-2 border border-gray-300 rounded-md focus:ring-2 focus:ring-blue-500 focus:border-blue-500"
+              >
+                <option value="fast">Fast (quick quiz, lower quality)</option>
+                <option value="balanced">Balanced</option>
+                <option value="thorough">Thorough (slower, best quality)</option>
+              </select>
+            </div>
+            <div className="flex items-center space-x-2">
+              <input
+                id="forceRegenerate"
+                type="checkbox"
+                checked={forceRegenerate}
+                onChange={(e) => updateState({ forceRegenerate: e.target.checked })}
+                className="h-4 w-4 text-blue-600 border-gray-300 rounded focus:ring-blue-500"
+              />
+              <label htmlFor="forceRegenerate" className="text-sm font-medium text-gray-700">
+                Generate new questions instead of reusing earlier ones for the same content
+              </label>
+            </div>
             <button
               type="submit"
               disabled={(!subject || (inputType === 'text' && !textContent) || (inputType === 'pdf' && !pdfFile)) || isPolling}